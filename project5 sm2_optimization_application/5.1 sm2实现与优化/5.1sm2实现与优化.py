@@ -1,7 +1,26 @@
+import os
+import sys
+import json
+import mmap
 import random
+import argparse
+import platform
+import struct
 import hashlib
 import binascii
+import tempfile
+import threading
 import time
+import warnings
+import weakref
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+
+# 通用曲线引擎位于上一级目录, 与5.2、5.3的脚本共用
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ec_engine import CURVES, FIELD_BACKENDS, FIXED_BASE_WINDOW, WNAF_WINDOW, CurveEngine
 
 # SM2椭圆曲线参数（示例）
 P = 0xFFFFFFFEFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF00000000FFFFFFFFFFFFFFFF
@@ -11,6 +30,135 @@ N = 0xFFFFFFFEFFFFFFFFFFFFFFFFFFFFFFFF7203DF6B21C6052B53BBF40939D54123
 Gx = 0x32C4AE2C1F1981195F9904466A39C9948FE30BBFF2660BE1715A4589334C74C7
 Gy = 0xBC3736A2F4F6779C59BDCEE36B692153D0A9877CC62A474002DF32E52139F0A0
 
+# 基点G固定基预计算表的窗口宽度(比特)
+G_TABLE_WINDOW = FIXED_BASE_WINDOW
+# 批量验签中同一公钥出现多少次时为其构建固定基窗口表
+BATCH_TABLE_MIN_ITEMS = 8
+# 进程级ZA缓存的容量(按 (ID, 公钥) 区分)
+ZA_CACHE_SIZE = 4096
+# 每个实例缓存的签名密钥个数(按 (私钥, ID) 区分), sign/sign_many 复用其中的公钥、ZA与 (1 + d)^-1
+SIGNING_KEY_CACHE_SIZE = 64
+# 验签方公钥表缓存: 公钥被验签多少次后升级为固定基窗口表, 表占用内存的默认上限,
+# 以及尚未升级的公钥最多跟踪多少个的计数
+PK_TABLE_THRESHOLD = 16
+PK_TABLE_MEMORY_BUDGET = 64 << 20
+PK_TABLE_TRACKED_KEYS = 4096
+# 进程池每个任务块的最大条目数(条目太少时IPC开销占比过高, 太多时负载不均)
+POOL_MAX_CHUNK = 256
+# 随机数池默认容量、低水位线与每批预计算的数量
+NONCE_POOL_SIZE = 256
+NONCE_POOL_LOW_WATERMARK = 64
+NONCE_POOL_BATCH = 32
+# 流式加解密每次读取的块大小, 以及C1∥C3∥C2格式下不可回写输出时内存暂存的上限
+STREAM_CHUNK_SIZE = 1 << 20
+STREAM_SPOOL_SIZE = 16 << 20
+# 密文格式: 国标默认的 C1∥C3∥C2, 以及可一遍流式处理的 C1∥C2∥C3
+LAYOUT_C1C3C2 = 'C1C3C2'
+LAYOUT_C1C2C3 = 'C1C2C3'
+# 预计算表文件: 头部 = 魔数, 版本, 窗口宽度, 窗口数, 每行点数, 曲线与基点摘要;
+# 之后为按行存放的仿射点 (x ∥ y, 各32字节大端), 末尾32字节为前面全部内容的SM3校验和
+TABLE_FILE_MAGIC = b'SM2T'
+TABLE_FILE_VERSION = 1
+TABLE_FILE_HEADER = struct.Struct('>4sHBxHH32s')
+# 设置该环境变量后, 导入模块时将以mmap方式加载指定文件中的基点G预计算表
+G_TABLE_ENV = 'SM2_G_TABLE_FILE'
+
+
+# ZA哈希输入中 ENTL ∥ ID ∥ a ∥ b ∥ Gx ∥ Gy 部分只与ID有关, 缓存吸收该前缀后的SM3中间状态
+@lru_cache(maxsize=64)
+def _za_prefix_state(ID):
+    entl = len(ID) * 8
+    ENTL = entl.to_bytes(2, 'big')
+    a_bytes = A.to_bytes(32, 'big')
+    b_bytes = B.to_bytes(32, 'big')
+    Gx_bytes = Gx.to_bytes(32, 'big')
+    Gy_bytes = Gy.to_bytes(32, 'big')
+
+    sm3_za = hashlib.new('sm3')
+    sm3_za.update(ENTL + ID + a_bytes + b_bytes + Gx_bytes + Gy_bytes)
+    return sm3_za
+
+
+# 计算 ZA = H256(ENTL ∥ ID ∥ a ∥ b ∥ Gx ∥ Gy ∥ xA ∥ yA)
+# 从前缀的中间状态继续, 只需吸收公钥坐标;
+# 并按 (ID, 公钥) 做进程级LRU缓存, 同一签名者的多条消息只需哈希一次
+@lru_cache(maxsize=ZA_CACHE_SIZE)
+def _compute_za(ID, public_key):
+    Px_bytes = public_key[0].to_bytes(32, 'big')
+    Py_bytes = public_key[1].to_bytes(32, 'big')
+
+    sm3_za = _za_prefix_state(ID).copy()
+    sm3_za.update(Px_bytes + Py_bytes)
+    return sm3_za.digest()
+
+
+# 曲线参数与基点的摘要, 写入预计算表文件头部, 防止加载到其他曲线或其他点的表
+def _table_digest(base_point):
+    sm3 = hashlib.new('sm3')
+    for value in (P, A, B, N, base_point[0], base_point[1]):
+        sm3.update(value.to_bytes(32, 'big'))
+    return sm3.digest()
+
+
+# mmap中的固定基窗口表: 加载时无需重建或反序列化, 某一行第一次被访问时才解码为整数并缓存
+class _MappedPointTable:
+    def __init__(self, buffer, offset, windows, row_size):
+        self.buffer = buffer
+        self.offset = offset
+        self.windows = windows
+        self.row_size = row_size
+        self.rows = [None] * windows
+
+    def __len__(self):
+        return self.windows
+
+    def __getitem__(self, i):
+        row = self.rows[i]
+        if row is None:
+            start = self.offset + i * self.row_size * 64
+            data = self.buffer[start:start + self.row_size * 64]
+            row = [(int.from_bytes(data[j:j + 32], 'big'), int.from_bytes(data[j + 32:j + 64], 'big'))
+                   for j in range(0, len(data), 64)]
+            self.rows[i] = row
+        return row
+
+    def __iter__(self):
+        for i in range(self.windows):
+            yield self[i]
+
+
+# 整块异或: 转换为大整数后一次异或, 避免逐字节的Python循环
+def _xor_bytes(data, key):
+    n = len(data)
+    return (int.from_bytes(data, 'big') ^ int.from_bytes(key[:n], 'big')).to_bytes(n, 'big')
+
+
+# 增量KDF密钥流: 按需生成 H(Z ∥ ct) 分组, 内存占用与总长度无关
+# Z对所有计数器相同, 预先吸收Z得到SM3中间状态, 每个分组只需复制状态并吸收4字节计数器
+class _KDFStream:
+    def __init__(self, Z):
+        self.state = hashlib.new('sm3')
+        self.state.update(Z)
+        self.ct = 1
+        self.buffer = b''
+        self.nonzero = False  # 已输出的密钥流中是否出现过非零字节
+
+    def read(self, n):
+        blocks = max(0, (n - len(self.buffer) + 31) // 32)
+        output = [self.buffer]
+        state = self.state
+        for ct in range(self.ct, self.ct + blocks):
+            sm3 = state.copy()
+            sm3.update(ct.to_bytes(4, 'big'))
+            output.append(sm3.digest())
+        self.ct += blocks
+        data = b''.join(output)
+        self.buffer = data[n:]
+        data = data[:n]
+        if not self.nonzero and data.count(0) != n:
+            self.nonzero = True
+        return data
+
 
 class SM2_Basic:
     def __init__(self):
@@ -229,167 +377,148 @@ class SM2_Basic:
         return b'\x04' + public_key[0].to_bytes(32, 'big') + public_key[1].to_bytes(32, 'big')
 
 
-class SM2_Optimized:
-    def __init__(self):
-        self.p = P
-        self.a = A
-        self.b = B
-        self.n = N
-        self.G = (Gx, Gy)
-        # 预计算G的雅可比坐标
-        self.G_jacobian = (Gx, Gy, 1)
-
-    # 模逆算法(扩展欧几里得)
-    def _mod_inverse(self, a, p):
-        old_r, r = a, p
-        old_s, s = 1, 0
-        while r != 0:
-            quotient = old_r // r
-            old_r, r = r, old_r - quotient * r
-            old_s, s = s, old_s - quotient * s
-        return old_s % p
-
-    # 雅可比坐标下的点加倍运算
-    def _jacobian_point_double(self, P):
-        if P[2] == 0:  # 无穷远点
-            return P
-
-        X1, Y1, Z1 = P
-
-        XX = (X1 * X1) % self.p
-        YY = (Y1 * Y1) % self.p
-        YYYY = (YY * YY) % self.p
-        ZZ = (Z1 * Z1) % self.p
-        S = 2 * ((X1 + YY) ** 2 - XX - YYYY) % self.p
-        M = (3 * XX + self.a * (ZZ * ZZ) % self.p) % self.p
-        T = (M * M - 2 * S) % self.p
-
-        # 计算新坐标
-        X3 = T
-        Y3 = (M * (S - T) - 8 * YYYY) % self.p
-        Z3 = ((Y1 + Z1) ** 2 - YY - ZZ) % self.p
-
-        return (X3, Y3, Z3)
-
-    # 雅可比坐标下的点加运算
-    def _jacobian_point_add(self, P, Q):
-        if P[2] == 0:  # P是无穷远点
-            return Q
-        if Q[2] == 0:  # Q是无穷远点
-            return P
-
-        X1, Y1, Z1 = P
-        X2, Y2, Z2 = Q
-
-        # 计算中间量
-        Z1Z1 = (Z1 * Z1) % self.p
-        Z2Z2 = (Z2 * Z2) % self.p
-        U1 = (X1 * Z2Z2) % self.p
-        U2 = (X2 * Z1Z1) % self.p
-        S1 = (Y1 * Z2 * Z2Z2) % self.p
-        S2 = (Y2 * Z1 * Z1Z1) % self.p
-
-        H = (U2 - U1) % self.p
-        R = (S2 - S1) % self.p
-
-        if H == 0:
-            if R == 0:
-                return self._jacobian_point_double(P)
-            return (0, 1, 0)  # 无穷远点
-
-        # 计算中间量
-        HH = (H * H) % self.p
-        HHH = (H * HH) % self.p
-        V = (U1 * HH) % self.p
-
-        # 计算新坐标
-        X3 = (R * R - HHH - 2 * V) % self.p
-        Y3 = (R * (V - X3) - S1 * HHH) % self.p
-        Z3 = (H * Z1 * Z2) % self.p
-
-        return (X3, Y3, Z3)
-
-    # 将雅可比坐标转换为仿射坐标
-    def _from_jacobian(self, P):
-        if P[2] == 0:  # 无穷远点
-            return (0, 0)
-
-        X, Y, Z = P
-        Z_inv = self._mod_inverse(Z, self.p)
-        Z_inv_sq = (Z_inv * Z_inv) % self.p
-        x = (X * Z_inv_sq) % self.p
-        y = (Y * Z_inv_sq * Z_inv) % self.p
-        return (x, y)
-
-    # 雅可比坐标点乘算法
-    def _point_mul(self, k, P):
-        # 处理无穷远点
-        if P == (0, 0):
-            return (0, 0)
-
-        # 将仿射坐标转换为雅可比坐标
-        if len(P) == 2:
-            X, Y = P
-            P_jac = (X, Y, 1)
-        else:
-            P_jac = P
-
-        # 初始化结果为无穷远点
-        result = (0, 1, 0)
-
-        # 二进制展开
-        while k > 0:
-            if k & 1:
-                result = self._jacobian_point_add(result, P_jac)
-            k >>= 1
-            if k > 0:
-                P_jac = self._jacobian_point_double(P_jac)
-
-        return self._from_jacobian(result)
+# 点运算、点乘与点编码由通用曲线引擎 CurveEngine 提供, 这里只实现SM2的加解密与签名
+class SM2_Optimized(CurveEngine):
+    # 基点G的固定基预计算表, 每个进程只构建一次, 所有实例共享(可从文件mmap加载)
+    _g_table = None
+
+    def __init__(self, backend=None):
+        super().__init__(CURVES['sm2p256v1'], backend)
+        # 可选的后台随机数池, 见 enable_nonce_pool
+        self.nonce_pool = None
+        # 可选的验签方公钥表缓存, 见 enable_public_key_cache
+        self.public_key_cache = None
+        # 签名密钥的LRU缓存: (私钥, ID) -> SigningKey
+        self._signing_keys = OrderedDict()
+        self._signing_keys_lock = threading.Lock()
+
+    # 获取基点G的预计算表(首次使用时构建)
+    def _get_g_table(self):
+        if SM2_Optimized._g_table is None:
+            SM2_Optimized._g_table = self._build_fixed_base_table(self.G)
+        return SM2_Optimized._g_table
+
+    # 将点P的固定基窗口表写入文件(先写临时文件再原子替换)
+    def save_point_table(self, path, P, table, window=G_TABLE_WINDOW):
+        row_size = (1 << window) - 1
+        header = TABLE_FILE_HEADER.pack(TABLE_FILE_MAGIC, TABLE_FILE_VERSION, window,
+                                        len(table), row_size, _table_digest(P))
+        checksum = hashlib.new('sm3')
+        checksum.update(header)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(header)
+            for row in table:
+                data = b''.join(x.to_bytes(32, 'big') + y.to_bytes(32, 'big') for x, y in row)
+                checksum.update(data)
+                f.write(data)
+            f.write(checksum.digest())
+        os.replace(tmp_path, path)
+
+    # 以mmap方式加载点P的固定基窗口表, 文件格式、曲线、基点或校验和不符时抛出ValueError
+    def load_point_table(self, path, P, window=G_TABLE_WINDOW):
+        with open(path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(buffer) < TABLE_FILE_HEADER.size + 32:
+            raise ValueError("Table file is truncated")
+        magic, version, file_window, windows, row_size, digest = TABLE_FILE_HEADER.unpack_from(buffer, 0)
+        if magic != TABLE_FILE_MAGIC or version != TABLE_FILE_VERSION:
+            raise ValueError("Unsupported table file format")
+        if file_window != window or row_size != (1 << window) - 1:
+            raise ValueError("Table file window does not match")
+        if windows != (self.n.bit_length() + window - 1) // window or digest != _table_digest(P):
+            raise ValueError("Table file was built for a different curve or base point")
+        body_end = TABLE_FILE_HEADER.size + windows * row_size * 64
+        if len(buffer) != body_end + 32:
+            raise ValueError("Table file size does not match")
+        checksum = hashlib.new('sm3')
+        checksum.update(memoryview(buffer)[:body_end])
+        if checksum.digest() != buffer[body_end:]:
+            raise ValueError("Table file checksum mismatch")
+        return _MappedPointTable(buffer, TABLE_FILE_HEADER.size, windows, row_size)
+
+    # 保存基点G的预计算表
+    def save_g_table(self, path):
+        self.save_point_table(path, self.G, self._get_g_table())
+
+    # 从文件加载基点G的预计算表, 供本进程所有实例共享
+    def load_g_table(self, path):
+        SM2_Optimized._g_table = self.load_point_table(path, self.G)
 
     # SM2密钥对生成
     def generate_keypair(self):
         private_key = random.randint(1, self.n - 1)
-        public_key = self._point_mul(private_key, self.G)
+        public_key = self._point_mul_base(private_key)
         return private_key, public_key
 
+    # 启用后台随机数池: 签名与加密直接取用预计算好的 (k, k*G), 在线路径不再做 k*G 点乘
+    def enable_nonce_pool(self, size=NONCE_POOL_SIZE, low_watermark=NONCE_POOL_LOW_WATERMARK,
+                          batch_size=NONCE_POOL_BATCH):
+        self.disable_nonce_pool()
+        self.nonce_pool = NoncePool(self, size, low_watermark, batch_size)
+        return self.nonce_pool
+
+    # 停用并清空随机数池
+    def disable_nonce_pool(self):
+        if self.nonce_pool is not None:
+            self.nonce_pool.close()
+            self.nonce_pool = None
+
+    # 启用验签方公钥表缓存: 频繁出现的公钥升级为固定基窗口表, t*PA 也无需倍点
+    def enable_public_key_cache(self, threshold=PK_TABLE_THRESHOLD, memory_budget=PK_TABLE_MEMORY_BUDGET):
+        self.public_key_cache = PublicKeyTableCache(self, threshold, memory_budget)
+        return self.public_key_cache
+
+    # 停用并清空公钥表缓存
+    def disable_public_key_cache(self):
+        self.public_key_cache = None
+
+    # 取一个随机数k及 k*G (仿射坐标), 优先从随机数池取, 池空时现场计算
+    def _take_nonce(self):
+        if self.nonce_pool is not None:
+            item = self.nonce_pool.take()
+            if item is not None:
+                return item
+        k = random.randint(1, self.n - 1)
+        return k, self._point_mul_base(k)
+
+    # 批量生成count个密钥对, 所有公钥共用一次模逆转换为仿射坐标
+    def generate_keypairs(self, count):
+        g_table = self._get_g_table()
+        private_keys = [random.randint(1, self.n - 1) for _ in range(count)]
+        points = [self._fixed_base_mul_jacobian(g_table, d) for d in private_keys]
+        return list(zip(private_keys, self._batch_from_jacobian(points)))
+
     # 密钥派生函数(基于SM3)
     def _kdf(self, Z, klen):
-        ct = 0x00000001
-        rcnt = (klen + 31) // 32
-        output = b''
-        for i in range(rcnt):
-            ct_bytes = ct.to_bytes(4, 'big')
-            hash_input = Z + ct_bytes
-            sm3 = hashlib.new('sm3')
-            sm3.update(hash_input)
-            output += sm3.digest()
-            ct += 1
-        return output[:klen]
+        return _KDFStream(Z).read(klen)
 
-    # SM2加密
-    def encrypt(self, public_key, msg):
+    # SM2加密, compressed为True时C1使用33字节的压缩编码
+    def encrypt(self, public_key, msg, compressed=False):
         if isinstance(msg, str):
             msg = msg.encode()
-        klen = len(msg)
-        k = random.randint(1, self.n - 1)
-
         # 计算C1
-        C1 = self._point_mul(k, self.G)
-        C1_bytes = b'\x04' + C1[0].to_bytes(32, 'big') + C1[1].to_bytes(32, 'big')
+        k, C1 = self._take_nonce()
 
         # 计算S
         S = self._point_mul(k, public_key)
-        S_bytes = b'\x04' + S[0].to_bytes(32, 'big') + S[1].to_bytes(32, 'big')
+
+        return self._encrypt_with_points(C1, S, msg, compressed)
+
+    # 由已计算好的 C1 = k*G 与 S = k*PB 生成密文 C1 ∥ C3 ∥ C2
+    def _encrypt_with_points(self, C1, S, msg, compressed=False):
+        klen = len(msg)
+        C1_bytes = self.encode_point(C1, compressed)
+        S_bytes = self.encode_point(S)
 
         # 计算派生密钥
         Z = S_bytes
         t = self._kdf(Z, klen)
-        if all(b == 0 for b in t):
+        if t.count(0) == klen:
             raise ValueError("KDF derived key is zero")
 
         # 计算密文C2
-        C2 = bytes([m ^ t_i for m, t_i in zip(msg, t)])
+        C2 = _xor_bytes(msg, t)
 
         # 计算C3
         sm3 = hashlib.new('sm3')
@@ -399,29 +528,44 @@ class SM2_Optimized:
 
         return C1_bytes + C3 + C2
 
-    # SM2解密
+    # 使用同一公钥批量加密多条消息
+    # 公钥的wNAF奇数倍表只预计算一次, 所有C1与S共用一次模逆转换为仿射坐标
+    def encrypt_many(self, public_key, msgs, compressed=False):
+        msgs = [msg.encode() if isinstance(msg, str) else msg for msg in msgs]
+        if not msgs:
+            return []
+        g_table = self._get_g_table()
+        pub_table = self._odd_multiples(public_key)
+
+        ks = [random.randint(1, self.n - 1) for _ in msgs]
+        points = [self._fixed_base_mul_jacobian(g_table, k) for k in ks]
+        points += [self._wnaf_mul_jacobian(k, pub_table) for k in ks]
+        affine = self._batch_from_jacobian(points)
+
+        count = len(msgs)
+        return [self._encrypt_with_points(affine[i], affine[count + i], msgs[i], compressed) for i in range(count)]
+
+    # SM2解密, C1可以是未压缩或压缩编码
     def decrypt(self, private_key, ciphertext):
         # 解析密文
-        if ciphertext[0] != 0x04:
-            raise ValueError("Invalid ciphertext format")
-        C1 = (int.from_bytes(ciphertext[1:33], 'big'),
-              int.from_bytes(ciphertext[33:65], 'big'))
-        C3 = ciphertext[65:97]
-        C2 = ciphertext[97:]
+        C1_len = self._encoded_point_length(ciphertext)
+        C1 = self.decode_point(ciphertext[:C1_len])
+        C3 = ciphertext[C1_len:C1_len + 32]
+        C2 = ciphertext[C1_len + 32:]
         klen = len(C2)
 
         # 计算椭圆曲线点S
         S = self._point_mul(private_key, C1)
-        S_bytes = b'\x04' + S[0].to_bytes(32, 'big') + S[1].to_bytes(32, 'big')
+        S_bytes = self.encode_point(S)
 
         # 计算派生密钥
         Z = S_bytes
         t = self._kdf(Z, klen)
-        if all(b == 0 for b in t):
+        if t.count(0) == klen:
             raise ValueError("KDF derived key is zero")
 
         # 解密消息
-        msg = bytes([c ^ t_i for c, t_i in zip(C2, t)])
+        msg = _xor_bytes(C2, t)
 
         # 验证C3
         sm3 = hashlib.new('sm3')
@@ -433,158 +577,1063 @@ class SM2_Optimized:
 
         return msg
 
-    # SM2签名
-    def sign(self, private_key, msg, ID=b'1234567812345678'):
-        if isinstance(msg, str):
-            msg = msg.encode()
+    # 使用同一私钥批量解密, 所有 d*C1 共用一次模逆转换为仿射坐标
+    def decrypt_many(self, private_key, ciphertexts):
+        C1_lens = [self._encoded_point_length(ciphertext) for ciphertext in ciphertexts]
+        C1s = self.decode_points([ciphertext[:C1_len] for ciphertext, C1_len in zip(ciphertexts, C1_lens)])
+        points = self._batch_from_jacobian([self._point_mul_jacobian(private_key, C1) for C1 in C1s])
+
+        msgs = []
+        for ciphertext, C1_len, S in zip(ciphertexts, C1_lens, points):
+            C3 = ciphertext[C1_len:C1_len + 32]
+            C2 = ciphertext[C1_len + 32:]
+            Z = self.encode_point(S)
+            t = self._kdf(Z, len(C2))
+            if t.count(0) == len(C2):
+                raise ValueError("KDF derived key is zero")
+            msg = _xor_bytes(C2, t)
+            sm3 = hashlib.new('sm3')
+            sm3.update(msg)
+            sm3.update(Z)
+            if sm3.digest() != C3:
+                raise ValueError("Hash verification failed")
+            msgs.append(msg)
+        return msgs
+
+    # 流式加密: 从reader分块读取明文, 将密文写入writer, 内存占用与明文长度无关
+    # layout为 LAYOUT_C1C2C3 时一遍写出; 为 LAYOUT_C1C3C2 时C3须在C2之前写出,
+    # 可回写(seekable)的writer先预留C3位置最后回填, 否则先将C2暂存到临时文件
+    # 返回写出的密文总长度
+    def encrypt_stream(self, public_key, reader, writer, layout=LAYOUT_C1C3C2, chunk_size=STREAM_CHUNK_SIZE,
+                       compressed=False):
+        if layout not in (LAYOUT_C1C3C2, LAYOUT_C1C2C3):
+            raise ValueError("Unknown ciphertext layout")
+        k, C1 = self._take_nonce()
+        S = self._point_mul(k, public_key)
+        C1_bytes = self.encode_point(C1, compressed)
+        Z = self.encode_point(S)
+
+        writer.write(C1_bytes)
+        spool = None
+        if layout == LAYOUT_C1C2C3:
+            c2_writer = writer
+        elif writer.seekable():
+            c3_offset = writer.tell()
+            writer.write(bytes(32))
+            c2_writer = writer
+        else:
+            spool = tempfile.SpooledTemporaryFile(max_size=STREAM_SPOOL_SIZE)
+            c2_writer = spool
 
-        # 计算ZA
-        entl = len(ID) * 8
-        ENTL = entl.to_bytes(2, 'big')
-        a_bytes = self.a.to_bytes(32, 'big')
-        b_bytes = self.b.to_bytes(32, 'big')
-        Gx_bytes = self.G[0].to_bytes(32, 'big')
-        Gy_bytes = self.G[1].to_bytes(32, 'big')
-        public_key = self._point_mul(private_key, self.G)
-        Px_bytes = public_key[0].to_bytes(32, 'big')
-        Py_bytes = public_key[1].to_bytes(32, 'big')
+        keystream = _KDFStream(Z)
+        sm3 = hashlib.new('sm3')
+        total = 0
+        while True:
+            chunk = reader.read(chunk_size)
+            if not chunk:
+                break
+            sm3.update(chunk)
+            c2_writer.write(_xor_bytes(chunk, keystream.read(len(chunk))))
+            total += len(chunk)
+        if not keystream.nonzero:
+            raise ValueError("KDF derived key is zero")
+        sm3.update(Z)
+        C3 = sm3.digest()
 
-        sm3_za = hashlib.new('sm3')
-        sm3_za.update(ENTL + ID + a_bytes + b_bytes + Gx_bytes + Gy_bytes + Px_bytes + Py_bytes)
-        ZA = sm3_za.digest()
+        if layout == LAYOUT_C1C2C3:
+            writer.write(C3)
+        elif spool is None:
+            end = writer.tell()
+            writer.seek(c3_offset)
+            writer.write(C3)
+            writer.seek(end)
+        else:
+            writer.write(C3)
+            spool.seek(0)
+            while True:
+                chunk = spool.read(chunk_size)
+                if not chunk:
+                    break
+                writer.write(chunk)
+            spool.close()
+        return len(C1_bytes) + 32 + total
+
+    # 流式解密: 从reader分块读取密文, 将明文写入writer
+    # 注意C3只能在读完全部C2后校验, 校验失败时抛出ValueError, 调用方须丢弃已写出的明文
+    # 返回写出的明文总长度
+    def decrypt_stream(self, private_key, reader, writer, layout=LAYOUT_C1C3C2, chunk_size=STREAM_CHUNK_SIZE):
+        if layout not in (LAYOUT_C1C3C2, LAYOUT_C1C2C3):
+            raise ValueError("Unknown ciphertext layout")
+        header = reader.read(1)
+        C1_len = self._encoded_point_length(header)
+        header += reader.read(C1_len - 1)
+        C1 = self.decode_point(header)
+        S = self._point_mul(private_key, C1)
+        Z = self.encode_point(S)
 
-        # 计算e = Hv(ZA ∥ M)
-        sm3_e = hashlib.new('sm3')
-        sm3_e.update(ZA + msg)
-        e = int.from_bytes(sm3_e.digest(), 'big')
+        C3 = None
+        if layout == LAYOUT_C1C3C2:
+            C3 = reader.read(32)
+            if len(C3) != 32:
+                raise ValueError("Invalid ciphertext format")
 
-        # 生成签名
+        keystream = _KDFStream(Z)
+        sm3 = hashlib.new('sm3')
+        total = 0
+        tail = b''  # C1∥C2∥C3格式下保留末尾32字节, 读完后即为C3
         while True:
-            k = random.randint(1, self.n - 1)
-            x1, y1 = self._point_mul(k, self.G)
-            r = (e + x1) % self.n
-            if r == 0 or r + k == self.n:
-                continue
-            s = (self._mod_inverse(1 + private_key, self.n) * (k - r * private_key)) % self.n
-            if s != 0:
+            chunk = reader.read(chunk_size)
+            if not chunk:
                 break
+            if C3 is None:
+                chunk = tail + chunk
+                tail = chunk[-32:]
+                chunk = chunk[:-32]
+                if not chunk:
+                    continue
+            msg = _xor_bytes(chunk, keystream.read(len(chunk)))
+            sm3.update(msg)
+            writer.write(msg)
+            total += len(msg)
+
+        if C3 is None:
+            if len(tail) != 32:
+                raise ValueError("Invalid ciphertext format")
+            C3 = tail
+        if not keystream.nonzero:
+            raise ValueError("KDF derived key is zero")
+        sm3.update(Z)
+        if sm3.digest() != C3:
+            raise ValueError("Hash verification failed")
+        return total
 
+    # 计算 e = Hv(ZA ∥ M)
+    def _hash_e(self, ZA, msg):
+        if isinstance(msg, str):
+            msg = msg.encode()
+        sm3_e = hashlib.new('sm3')
+        sm3_e.update(ZA)
+        sm3_e.update(msg)
+        return int.from_bytes(sm3_e.digest(), 'big')
+
+    # 由公钥与ID计算e, ZA取自进程级缓存
+    def _compute_e(self, public_key, msg, ID):
+        return self._hash_e(_compute_za(ID, tuple(public_key)), msg)
+
+    # 创建可重复使用的签名密钥(公钥、ZA与 (1 + d)^-1 只计算一次)
+    def signing_key(self, private_key, ID=b'1234567812345678'):
+        return SigningKey(self, private_key, ID)
+
+    # 创建可重复使用的验签密钥(ZA只计算一次)
+    def verifying_key(self, public_key, ID=b'1234567812345678'):
+        return VerifyingKey(self, public_key, ID)
+
+    # 取缓存的签名密钥, 未命中时创建; 同一私钥重复签名时不再重新计算 d*G 与 (1 + d)^-1
+    def _cached_signing_key(self, private_key, ID):
+        key = (private_key, ID)
+        with self._signing_keys_lock:
+            signing_key = self._signing_keys.get(key)
+            if signing_key is not None:
+                self._signing_keys.move_to_end(key)
+                return signing_key
+        signing_key = SigningKey(self, private_key, ID)
+        with self._signing_keys_lock:
+            self._signing_keys[key] = signing_key
+            if len(self._signing_keys) > SIGNING_KEY_CACHE_SIZE:
+                self._signing_keys.popitem(last=False)
+        return signing_key
+
+    # SM2签名
+    def sign(self, private_key, msg, ID=b'1234567812345678'):
+        return self._cached_signing_key(private_key, ID).sign(msg)
+
+    # 对摘要e签名, d_inv = (1 + d)^-1 mod n
+    def _sign_e(self, private_key, d_inv, e):
+        while True:
+            k, (x1, y1) = self._take_nonce()
+            signature = self._sign_with_nonce(private_key, d_inv, e, k, x1)
+            if signature is not None:
+                return signature
+
+    # 由随机数k及 k*G 的x坐标计算签名, r或s不合法时返回None
+    def _sign_with_nonce(self, private_key, d_inv, e, k, x1):
+        r = (e + x1) % self.n
+        if r == 0 or r + k == self.n:
+            return None
+        s = (d_inv * (k - r * private_key)) % self.n
+        if s == 0:
+            return None
         return r.to_bytes(32, 'big') + s.to_bytes(32, 'big')
 
+    # 使用同一私钥批量签名多条消息
+    def sign_many(self, private_key, msgs, ID=b'1234567812345678'):
+        return self._cached_signing_key(private_key, ID).sign_many(msgs)
+
+    # 批量对摘要签名, 所有 k*G 共用一次模逆转换为仿射坐标
+    def _sign_many_e(self, private_key, d_inv, es):
+        signatures = [None] * len(es)
+        g_table = self._get_g_table()
+        pending = list(range(len(es)))
+        # r或s不合法的极少数情况换新的k重试
+        while pending:
+            ks = [random.randint(1, self.n - 1) for _ in pending]
+            points = self._batch_from_jacobian([self._fixed_base_mul_jacobian(g_table, k) for k in ks])
+            retry = []
+            for i, k, (x1, y1) in zip(pending, ks, points):
+                signatures[i] = self._sign_with_nonce(private_key, d_inv, es[i], k, x1)
+                if signatures[i] is None:
+                    retry.append(i)
+            pending = retry
+        return signatures
+
     # 签名验证
     def verify(self, public_key, msg, signature, ID=b'1234567812345678'):
-        if isinstance(msg, str):
-            msg = msg.encode()
+        return self._verify_e(public_key, self._compute_e(public_key, msg, ID), signature)
 
+    # 验证摘要e的签名
+    def _verify_e(self, public_key, e, signature):
         r = int.from_bytes(signature[:32], 'big')
         s = int.from_bytes(signature[32:], 'big')
         if not (1 <= r < self.n and 1 <= s < self.n):
             return False
 
-        # 计算ZA
-        entl = len(ID) * 8
-        ENTL = entl.to_bytes(2, 'big')
-        a_bytes = self.a.to_bytes(32, 'big')
-        b_bytes = self.b.to_bytes(32, 'big')
-        Gx_bytes = self.G[0].to_bytes(32, 'big')
-        Gy_bytes = self.G[1].to_bytes(32, 'big')
-        Px_bytes = public_key[0].to_bytes(32, 'big')
-        Py_bytes = public_key[1].to_bytes(32, 'big')
-
-        sm3_za = hashlib.new('sm3')
-        sm3_za.update(ENTL + ID + a_bytes + b_bytes + Gx_bytes + Gy_bytes + Px_bytes + Py_bytes)
-        ZA = sm3_za.digest()
-
-        # 计算e
-        sm3_e = hashlib.new('sm3')
-        sm3_e.update(ZA + msg)
-        e = int.from_bytes(sm3_e.digest(), 'big')
-
         t = (r + s) % self.n
         if t == 0:
             return False
 
-        # 使用雅可比坐标优化点加
-        point1 = self._point_mul(s, self.G)
-        point2 = self._point_mul(t, public_key)
-
-        P1_jac = (point1[0], point1[1], 1)
-        P2_jac = (point2[0], point2[1], 1)
-        sum_jac = self._jacobian_point_add(P1_jac, P2_jac)
+        table = None
+        if self.public_key_cache is not None:
+            table = self.public_key_cache.get(public_key)
+        if table is not None:
+            # 热点公钥: s*G 与 t*PA 均为查表累加, 无需倍点
+            acc = self._fixed_base_mul_jacobian(table, t)
+            sum_jac = self._fixed_base_mul_jacobian(self._get_g_table(), s, result=acc)
+        else:
+            # 同时计算 s*G + t*PA, 只在最后做一次模逆
+            sum_jac = self._dual_point_mul(s, self.G, t, public_key)
         x1, y1 = self._from_jacobian(sum_jac)
 
         R = (e + x1) % self.n
         return R == r
 
-    def serialize_public_key(self, public_key):
-        return b'\x04' + public_key[0].to_bytes(32, 'big') + public_key[1].to_bytes(32, 'big')
+    # 批量签名验证: items中每项为 (public_key, msg, signature) 或 (public_key, msg, signature, ID)
+    # 返回与items顺序一致的验证结果列表
+    # SM2签名只携带 r = e + x1 mod n, 无法还原R的y坐标, 因此不能把整批签名合并为一个
+    # 多标量乘法等式来逐项判定; 这里改为在整批内共享预计算与模逆:
+    #   1. 同一公钥只预计算一次wNAF奇数倍表, 所有公钥的表共用一次模逆;
+    #   2. 批内出现至少BATCH_TABLE_MIN_ITEMS次的公钥构建固定基窗口表, t*PA也无需倍点;
+    #   3. s*G 使用G的固定基表直接累加到 t*PA 的雅可比结果上;
+    #   4. 所有结果点共用一次模逆转换为仿射坐标。
+    def verify_batch(self, items):
+        results = [False] * len(items)
+        pending = []  # (下标, r, e, s, t, public_key)
+        key_counts = {}
+        for idx, item in enumerate(items):
+            public_key, msg, signature = item[0], item[1], item[2]
+            ID = item[3] if len(item) > 3 else b'1234567812345678'
+            public_key = tuple(public_key)
+
+            r = int.from_bytes(signature[:32], 'big')
+            s = int.from_bytes(signature[32:], 'big')
+            if not (1 <= r < self.n and 1 <= s < self.n):
+                continue
+            t = (r + s) % self.n
+            if t == 0:
+                continue
+            e = self._compute_e(public_key, msg, ID)
+            pending.append((idx, r, e, s, t, public_key))
+            key_counts[public_key] = key_counts.get(public_key, 0) + 1
+
+        if not pending:
+            return results
+
+        # 为每个公钥选择预计算方式
+        fixed_tables = {}
+        odd_jacobian = []
+        odd_keys = []
+        for public_key, count in key_counts.items():
+            table = None
+            if self.public_key_cache is not None:
+                table = self.public_key_cache.get(public_key, count)
+            if table is None and count >= BATCH_TABLE_MIN_ITEMS:
+                table = self._build_fixed_base_table(public_key)
+            if table is not None:
+                fixed_tables[public_key] = table
+            else:
+                odd_jacobian.extend(self._odd_multiples_jacobian(public_key))
+                odd_keys.append(public_key)
+
+        # 所有公钥的奇数倍表共用一次模逆
+        odd_affine = self._batch_from_jacobian(odd_jacobian)
+        size = 1 << (WNAF_WINDOW - 2)
+        odd_tables = {key: odd_affine[i * size:(i + 1) * size] for i, key in enumerate(odd_keys)}
+
+        # 计算每项的 s*G + t*PA (雅可比坐标)
+        g_table = self._get_g_table()
+        sums = []
+        for idx, r, e, s, t, public_key in pending:
+            if public_key in fixed_tables:
+                acc = self._fixed_base_mul_jacobian(fixed_tables[public_key], t)
+            else:
+                acc = self._wnaf_mul_jacobian(t, odd_tables[public_key])
+            sums.append(self._fixed_base_mul_jacobian(g_table, s, result=acc))
+
+        # 所有结果共用一次模逆
+        for (idx, r, e, s, t, public_key), (x1, y1), point in zip(pending, self._batch_from_jacobian(sums), sums):
+            if point[2] == 0:
+                continue
+            results[idx] = (e + x1) % self.n == r
+        return results
+
+    def serialize_public_key(self, public_key, compressed=False):
+        return self.encode_point(public_key, compressed)
+
+    def deserialize_public_key(self, data):
+        return self.decode_point(data)
+
+
+# 验签方公钥表缓存: 公钥累计验签次数达到阈值后升级为固定基窗口表,
+# 表按LRU淘汰, 总占用不超过memory_budget字节; 尚未升级的公钥只保留有界的计数
+class PublicKeyTableCache:
+    def __init__(self, sm2, threshold=PK_TABLE_THRESHOLD, memory_budget=PK_TABLE_MEMORY_BUDGET,
+                 tracked_keys=PK_TABLE_TRACKED_KEYS):
+        self.sm2 = sm2
+        self.threshold = threshold
+        self.memory_budget = memory_budget
+        self.tracked_keys = tracked_keys
+        self._tables = OrderedDict()  # 公钥 -> (表, 占用字节数)
+        self._counts = OrderedDict()  # 尚未升级的公钥 -> 累计次数
+        self._lock = threading.Lock()
+        self.memory_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.promotions = 0
+        self.evictions = 0
+
+    # 返回公钥的预计算表; 尚未达到阈值时返回None。uses为本次的验签次数(批量验签时可大于1)
+    def get(self, public_key, uses=1):
+        public_key = tuple(public_key)
+        with self._lock:
+            entry = self._tables.get(public_key)
+            if entry is not None:
+                self._tables.move_to_end(public_key)
+                self.hits += uses
+                return entry[0]
+            self.misses += uses
+            count = self._counts.pop(public_key, 0) + uses
+            if count < self.threshold:
+                self._counts[public_key] = count
+                if len(self._counts) > self.tracked_keys:
+                    self._counts.popitem(last=False)
+                return None
+
+        # 建表较慢, 在锁外进行
+        table = self.sm2._build_fixed_base_table(public_key)
+        size = _table_size(table)
+        with self._lock:
+            if size > self.memory_budget:
+                return table
+            if public_key not in self._tables:
+                self._tables[public_key] = (table, size)
+                self.memory_used += size
+                self.promotions += 1
+                while self.memory_used > self.memory_budget:
+                    _, (_, evicted_size) = self._tables.popitem(last=False)
+                    self.memory_used -= evicted_size
+                    self.evictions += 1
+        return table
+
+    def __len__(self):
+        return len(self._tables)
+
+    # 统计快照
+    def stats(self):
+        with self._lock:
+            return {
+                'tables': len(self._tables),
+                'memory_used': self.memory_used,
+                'memory_budget': self.memory_budget,
+                'hits': self.hits,
+                'misses': self.misses,
+                'promotions': self.promotions,
+                'evictions': self.evictions,
+            }
+
+
+# 估算预计算表占用的内存(列表、元组与整数对象)
+def _table_size(table):
+    size = sys.getsizeof(table)
+    for row in table:
+        size += sys.getsizeof(row)
+        for point in row:
+            size += sys.getsizeof(point) + sys.getsizeof(point[0]) + sys.getsizeof(point[1])
+    return size
+
+
+# 后台随机数池: 后台线程批量预计算 (k, k*G) 并保存在有界队列中
+# 队列长度低于低水位线时唤醒后台线程补充到容量上限; 每一项只会被取出一次,
+# 取出即从队列删除; fork出的子进程会清空继承的队列, 避免父子进程使用同一个k
+class NoncePool:
+    def __init__(self, sm2, size=NONCE_POOL_SIZE, low_watermark=NONCE_POOL_LOW_WATERMARK,
+                 batch_size=NONCE_POOL_BATCH):
+        if not 0 <= low_watermark < size:
+            raise ValueError("low_watermark must be in [0, size)")
+        self.sm2 = sm2
+        self.size = size
+        self.low_watermark = low_watermark
+        self.batch_size = batch_size
+        self._items = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._needs_restart = False
+        self._start()
+        _live_nonce_pools.add(self)
+
+    def _start(self):
+        self._needs_restart = False
+        self._items.clear()
+        self._wakeup.set()
+        self._thread = threading.Thread(target=self._run, name="sm2-nonce-pool", daemon=True)
+        self._thread.start()
+
+    # fork后在子进程中调用: 父进程的补充线程可能正持有锁, 继承的锁将永远无法释放, 需重建锁与事件;
+    # 后台线程不会被fork复制, 标记为待重启, 由第一次take()重新启动
+    def _reset_after_fork(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._items = deque()
+        self._needs_restart = True
+
+    # 后台补充线程
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            if self._closed:
+                return
+            self._wakeup.clear()
+            while not self._closed and len(self._items) < self.size:
+                count = min(self.batch_size, self.size - len(self._items))
+                batch = self.sm2.generate_keypairs(count)
+                with self._lock:
+                    if self._closed:
+                        return
+                    self._items.extend(batch)
+
+    # 取出一个 (k, k*G), 池空时返回None
+    def take(self):
+        with self._lock:
+            if self._needs_restart and not self._closed:
+                # fork后的子进程: 重新启动后台线程
+                self._start()
+            try:
+                item = self._items.popleft()
+            except IndexError:
+                item = None
+            remaining = len(self._items)
+        if remaining < self.low_watermark:
+            self._wakeup.set()
+        return item
+
+    def __len__(self):
+        return len(self._items)
+
+    # 停止后台线程并丢弃剩余的随机数
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        with self._lock:
+            self._items.clear()
+        _live_nonce_pools.discard(self)
+
+
+# 当前进程中的随机数池; 整个模块只注册一个fork钩子, 在子进程中逐个重置
+_live_nonce_pools = weakref.WeakSet()
+
+
+def _reset_nonce_pools_after_fork():
+    for pool in list(_live_nonce_pools):
+        pool._reset_after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_nonce_pools_after_fork)
+
+
+# SM2签名密钥: 公钥PA、ZA(ID, PA)与 (1 + d)^-1 mod n 在创建时计算一次,
+# 之后每条消息只需一次 k*G 点乘
+class SigningKey:
+    def __init__(self, sm2, private_key, ID=b'1234567812345678'):
+        self.sm2 = sm2
+        self.private_key = private_key
+        self.ID = ID
+        self.public_key = sm2._point_mul_base(private_key)
+        self.ZA = _compute_za(ID, self.public_key)
+        self.d_inv = sm2._mod_inverse(1 + private_key, sm2.n)
+
+    # 对应的验签密钥
+    def verifying_key(self):
+        return VerifyingKey(self.sm2, self.public_key, self.ID)
+
+    def sign(self, msg):
+        return self.sm2._sign_e(self.private_key, self.d_inv, self.sm2._hash_e(self.ZA, msg))
+
+    def sign_many(self, msgs):
+        es = [self.sm2._hash_e(self.ZA, msg) for msg in msgs]
+        return self.sm2._sign_many_e(self.private_key, self.d_inv, es)
+
+
+# SM2验签密钥: ZA(ID, PA)在创建时计算一次
+class VerifyingKey:
+    def __init__(self, sm2, public_key, ID=b'1234567812345678'):
+        self.sm2 = sm2
+        self.public_key = tuple(public_key)
+        self.ID = ID
+        self.ZA = _compute_za(ID, self.public_key)
+
+    def verify(self, msg, signature):
+        return self.sm2._verify_e(self.public_key, self.sm2._hash_e(self.ZA, msg), signature)
+
+
+# 运算计数与分阶段计时(插桩)
+# with instrument(sm2) as stats: 期间在实例上安装包装方法(实例属性遮蔽类方法), 退出时删除,
+# 未启用时没有任何额外开销; SM2_Basic 与 SM2_Optimized 均可使用
+# 统计按公开接口的最外层调用归类, 不属于任何公开接口的调用(如 SigningKey.sign)计入 '(other)'
+
+# 被统计的公开接口(实例上不存在的跳过)
+INSTRUMENT_APIS = ('generate_keypair', 'generate_keypairs', 'encrypt', 'encrypt_many', 'encrypt_stream',
+                   'decrypt', 'decrypt_many', 'decrypt_stream', 'sign', 'sign_many', 'verify', 'verify_batch',
+                   'decode_point', 'decode_points')
+
+# 各阶段包含的内部方法; 阶段时间为独占时间, 嵌套进入其他阶段时暂停, 未归入任何阶段的时间计入 'other'
+INSTRUMENT_PHASES = {
+    'hash': ('_compute_e', '_hash_e'),
+    'scalar_mul': ('_point_mul', '_point_mul_base', '_point_mul_jacobian', '_wnaf_mul_jacobian',
+                   '_fixed_base_mul_jacobian', '_dual_point_mul'),
+    'precompute': ('_odd_multiples_jacobian', '_build_fixed_base_table'),
+    'normalize': ('_from_jacobian', '_batch_from_jacobian'),
+    'kdf': ('_kdf',),
+}
+
+# 域运算原语及其调用计数器; 计数时参数中的坐标转换为 _CountingInt, 以统计其中的域乘法
+INSTRUMENT_PRIMITIVES = {
+    '_jacobian_point_double': 'point_double',
+    '_jacobian_point_add': 'point_add',
+    '_jacobian_point_add_affine': 'point_add_mixed',
+    '_point_add': 'point_add',  # SM2_Basic 的仿射点加, P == Q 时计为 point_double
+    '_from_jacobian': 'normalize',
+    '_batch_from_jacobian': 'normalize',
+    '_decompress_y': 'sqrt',
+}
+
+# 当前线程的运算计数器(字典), 只有执行插桩的线程会设置
+_op_sink = threading.local()
+
+
+def _count_op(name):
+    counts = getattr(_op_sink, 'counts', None)
+    if counts is not None:
+        counts[name] = counts.get(name, 0) + 1
+
+
+# 统计乘法的整数类型: 结果仍为 _CountingInt, 因此由坐标派生出的所有中间值都会被统计
+# 两个操作数相同计为平方, 与小常数(如 2、3、8)相乘单独计数
+class _CountingInt(int):
+    __slots__ = ()
+
+    def __mul__(self, other):
+        if self == other:
+            _count_op('field_sqr')
+        elif -0x100000000 < self < 0x100000000 or -0x100000000 < other < 0x100000000:
+            _count_op('field_mul_small')
+        else:
+            _count_op('field_mul')
+        return _CountingInt(int.__mul__(self, other))
+
+    __rmul__ = __mul__
+
+    def __pow__(self, e, mod=None):
+        if e == 2 and mod is None:
+            _count_op('field_sqr')
+        return _CountingInt(int.__pow__(self, e, mod))
+
+    def __add__(self, other):
+        return _CountingInt(int.__add__(self, other))
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return _CountingInt(int.__sub__(self, other))
+
+    def __rsub__(self, other):
+        return _CountingInt(int.__rsub__(self, other))
+
+    def __mod__(self, other):
+        return _CountingInt(int.__mod__(self, other))
+
+    def __rmod__(self, other):
+        return _CountingInt(int.__rmod__(self, other))
+
+    def __neg__(self):
+        return _CountingInt(int.__neg__(self))
+
+
+# 递归转换元组/列表中的整数: 转为计数整数, 或还原为普通int
+def _to_counting(value):
+    if type(value) is int:
+        return _CountingInt(value)
+    if isinstance(value, (tuple, list)):
+        return type(value)(_to_counting(v) for v in value)
+    return value
+
+
+def _from_counting(value):
+    if isinstance(value, _CountingInt):
+        return int(value)
+    if isinstance(value, (tuple, list)):
+        return type(value)(_from_counting(v) for v in value)
+    return value
+
+
+def _new_record():
+    return {'calls': 0, 'time_ns': 0, 'ops': {}, 'phases_ns': {}}
+
+
+class Instrumentation:
+    def __init__(self, sm2, count_ops=True):
+        self.sm2 = sm2
+        self.count_ops = count_ops
+        self._records = {}
+        self._installed = []
+        self._saved_fields = {}
+
+    def __enter__(self):
+        sm2 = self.sm2
+        if '_instrumentation' in vars(sm2):
+            raise RuntimeError("Instance is already instrumented")
+        sm2._instrumentation = self
+        self._thread = threading.get_ident()
+        self._current = self._record('(other)')
+        self._stack = []
+        self._mark = 0
+        if self.count_ops:
+            # p与a也转换为计数整数, 保证 % p 之后的结果不会退化为普通整数(或gmpy2的mpz)
+            self._saved_fields = {name: getattr(sm2, name) for name in ('p', 'a')}
+            for name, value in self._saved_fields.items():
+                setattr(sm2, name, _CountingInt(int(value)))
+            _op_sink.counts = self._current['ops']
+
+        phase_of = {method: phase for phase, methods in INSTRUMENT_PHASES.items() for method in methods}
+        for name in set(INSTRUMENT_APIS) | set(phase_of) | set(INSTRUMENT_PRIMITIVES) | {'_mod_inverse'}:
+            original = getattr(sm2, name, None)
+            if original is None:
+                continue
+            if name in INSTRUMENT_APIS:
+                wrapper = self._wrap_api(name, original)
+            else:
+                wrapper = self._wrap_internal(name, original, phase_of.get(name))
+            setattr(sm2, name, wrapper)
+            self._installed.append(name)
+        return self
+
+    def __exit__(self, *exc):
+        sm2 = self.sm2
+        for name in self._installed:
+            delattr(sm2, name)
+        self._installed = []
+        for name, value in self._saved_fields.items():
+            setattr(sm2, name, value)
+        self._saved_fields = {}
+        if self.count_ops:
+            _op_sink.counts = None
+        del sm2._instrumentation
+
+    def _record(self, name):
+        record = self._records.get(name)
+        if record is None:
+            record = self._records[name] = _new_record()
+        return record
+
+    # 阶段计时: 进入新阶段时先把已经过的时间记到栈顶阶段
+    def _push_phase(self, phase):
+        now = time.perf_counter_ns()
+        if self._stack:
+            phases = self._current['phases_ns']
+            top = self._stack[-1]
+            phases[top] = phases.get(top, 0) + now - self._mark
+        self._stack.append(phase)
+        self._mark = now
+
+    def _pop_phase(self):
+        now = time.perf_counter_ns()
+        phases = self._current['phases_ns']
+        top = self._stack.pop()
+        phases[top] = phases.get(top, 0) + now - self._mark
+        self._mark = now
+
+    def _wrap_api(self, name, original):
+        def wrapper(*args, **kwargs):
+            # 其他线程(如随机数池)或嵌套的公开接口调用直接执行
+            if threading.get_ident() != self._thread or self._stack:
+                return original(*args, **kwargs)
+            outer = self._current
+            self._current = record = self._record(name)
+            record['calls'] += 1
+            if self.count_ops:
+                _op_sink.counts = record['ops']
+            start = time.perf_counter_ns()
+            self._push_phase('other')
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self._pop_phase()
+                record['time_ns'] += time.perf_counter_ns() - start
+                self._current = outer
+                if self.count_ops:
+                    _op_sink.counts = outer['ops']
+        return wrapper
+
+    def _wrap_internal(self, name, original, phase):
+        counter = INSTRUMENT_PRIMITIVES.get(name)
+        count_ops = self.count_ops
+        sm2 = self.sm2
+
+        def wrapper(*args, **kwargs):
+            if threading.get_ident() != self._thread:
+                return original(*args, **kwargs)
+            if count_ops:
+                if name == '_mod_inverse':
+                    # 模逆内部的运算不计入域乘法
+                    _count_op('inversion' if args[1] == sm2.p else 'scalar_inversion')
+                    return _CountingInt(original(int(args[0]), int(args[1])))
+                if counter == 'normalize' and name == '_batch_from_jacobian':
+                    ops = self._current['ops']
+                    ops['normalize'] = ops.get('normalize', 0) + len(args[0])
+                elif name == '_point_add' and args[0] == args[1]:
+                    _count_op('point_double')
+                elif counter is not None:
+                    _count_op(counter)
+                if counter is not None:
+                    args = _to_counting(args)
+            if phase is not None:
+                self._push_phase(phase)
+            try:
+                result = original(*args, **kwargs)
+            finally:
+                if phase is not None:
+                    self._pop_phase()
+            return _from_counting(result) if count_ops and counter is not None else result
+        return wrapper
+
+    # 当前统计的快照(深拷贝)
+    def snapshot(self):
+        return {name: {'calls': record['calls'], 'time_ns': record['time_ns'],
+                       'ops': dict(record['ops']), 'phases_ns': dict(record['phases_ns'])}
+                for name, record in self._records.items()
+                if record['calls'] or record['ops'] or record['phases_ns']}
+
+    # 每次调用的平均值
+    def per_call(self):
+        result = {}
+        for name, record in self.snapshot().items():
+            calls = record['calls'] or 1
+            result[name] = {'calls': record['calls'], 'time_ns': record['time_ns'] / calls,
+                            'ops': {k: v / calls for k, v in record['ops'].items()},
+                            'phases_ns': {k: v / calls for k, v in record['phases_ns'].items()}}
+        return result
+
+    # 清零统计(原地清空, 正在进行的调用仍记入同一记录)
+    def reset(self):
+        for record in self._records.values():
+            record['calls'] = 0
+            record['time_ns'] = 0
+            record['ops'].clear()
+            record['phases_ns'].clear()
+
+
+# 对SM2实例启用插桩: count_ops为False时只做分阶段计时, 开销更小, 计时也更接近真实耗时
+def instrument(sm2, count_ops=True):
+    return Instrumentation(sm2, count_ops)
+
+
+# 基准测试
+# 每个用例先预热, 再用 perf_counter_ns 逐次采样, 报告每秒操作数与 p50/p95/p99 延迟;
+# 结果可保存为JSON, 并与保存的基线逐项比较, 标记变慢超过阈值的用例
+
+# 参与测试的实现: 名称 -> (构造函数, 最大消息长度)
+# SM2_Basic 的KDF逐块拼接输出、C2逐字节异或, 大消息耗时过长, 只测到64KB
+BENCH_ENGINES = {'SM2_Basic': (SM2_Basic, 64 << 10)}
+BENCH_ENGINES.update({f'SM2_Optimized[{name}]': (partial(SM2_Optimized, name), None) for name in FIELD_BACKENDS})
+BENCH_OPS = ('keygen', 'sign', 'verify', 'encrypt', 'decrypt')
+BENCH_SIZES = (32, 1 << 10, 64 << 10, 1 << 20, 10 << 20)
+# 基线比较的默认阈值: p50 变慢超过10%视为退化
+BENCH_REGRESSION_THRESHOLD = 0.10
+
+
+def _format_size(size):
+    for unit, shift in (('MB', 20), ('KB', 10)):
+        if size >= 1 << shift and size % (1 << shift) == 0:
+            return f"{size >> shift}{unit}"
+    return f"{size}B"
+
+
+def _percentile(sorted_samples, q):
+    return sorted_samples[min(len(sorted_samples) - 1, int(q * len(sorted_samples)))]
+
+
+# 测量单个用例: 预热warmup次后最多采样repeat次,
+# 已有min_repeat个样本且累计超过max_seconds秒时提前结束(大消息用例)
+def _bench_case(fn, warmup, repeat, min_repeat, max_seconds):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    deadline = time.perf_counter_ns() + int(max_seconds * 1e9)
+    while len(samples) < repeat:
+        start = time.perf_counter_ns()
+        fn()
+        end = time.perf_counter_ns()
+        samples.append(end - start)
+        if len(samples) >= min_repeat and end > deadline:
+            break
+    samples.sort()
+    mean = sum(samples) / len(samples)
+    return {
+        'samples': len(samples),
+        'ops_per_sec': 1e9 / mean,
+        'mean_ns': mean,
+        'min_ns': samples[0],
+        'p50_ns': _percentile(samples, 0.50),
+        'p95_ns': _percentile(samples, 0.95),
+        'p99_ns': _percentile(samples, 0.99),
+    }
+
+
+# 运行基准测试, 返回 {'meta': 运行环境与参数, 'results': 每个用例一项}
+# keygen与消息长度无关, 只测一次(size记为0); progress为每完成一个用例调用一次的回调
+def run_benchmarks(engines=None, ops=BENCH_OPS, sizes=BENCH_SIZES, warmup=3, repeat=30, min_repeat=5,
+                   max_seconds=2.0, progress=None):
+    engines = list(engines or BENCH_ENGINES)
+    messages = {size: random.randbytes(size) for size in sizes}
+    results = []
+    for engine_name in engines:
+        factory, max_size = BENCH_ENGINES[engine_name]
+        sm2 = factory()
+        private_key, public_key = sm2.generate_keypair()
+        cases = [('keygen', 0, sm2.generate_keypair)] if 'keygen' in ops else []
+        for size in sizes:
+            if max_size is not None and size > max_size:
+                continue
+            msg = messages[size]
+            if 'sign' in ops:
+                cases.append(('sign', size, partial(sm2.sign, private_key, msg)))
+            if 'verify' in ops:
+                cases.append(('verify', size, partial(sm2.verify, public_key, msg, sm2.sign(private_key, msg))))
+            if 'encrypt' in ops:
+                cases.append(('encrypt', size, partial(sm2.encrypt, public_key, msg)))
+            if 'decrypt' in ops:
+                cases.append(('decrypt', size, partial(sm2.decrypt, private_key, sm2.encrypt(public_key, msg))))
+        for op, size, fn in cases:
+            result = {'engine': engine_name, 'op': op, 'size': size}
+            result.update(_bench_case(fn, warmup, repeat, min_repeat, max_seconds))
+            results.append(result)
+            if progress is not None:
+                progress(result)
+    meta = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'field_backends': list(FIELD_BACKENDS),
+        'warmup': warmup,
+        'repeat': repeat,
+        'min_repeat': min_repeat,
+        'max_seconds': max_seconds,
+    }
+    return {'meta': meta, 'results': results}
+
+
+# 与基线逐项比较(按 engine、op、size 匹配, 比较p50延迟)
+# 返回比较结果列表, change为相对基线的变化比例, regression表示变慢超过threshold
+def compare_benchmarks(current, baseline, threshold=BENCH_REGRESSION_THRESHOLD):
+    baseline_index = {(r['engine'], r['op'], r['size']): r for r in baseline['results']}
+    comparisons = []
+    for result in current['results']:
+        base = baseline_index.get((result['engine'], result['op'], result['size']))
+        if base is None:
+            continue
+        change = result['p50_ns'] / base['p50_ns'] - 1
+        comparisons.append({
+            'engine': result['engine'],
+            'op': result['op'],
+            'size': result['size'],
+            'baseline_p50_ns': base['p50_ns'],
+            'current_p50_ns': result['p50_ns'],
+            'change': change,
+            'regression': change > threshold,
+        })
+    return comparisons
+
+
+def _print_bench_result(result):
+    size = '-' if result['op'] == 'keygen' else _format_size(result['size'])
+    print(f"{result['engine']:<22} {result['op']:<8} {size:>6} {result['ops_per_sec']:>10.1f}/s  "
+          f"p50 {result['p50_ns'] / 1e6:9.3f} ms  p95 {result['p95_ns'] / 1e6:9.3f} ms  "
+          f"p99 {result['p99_ns'] / 1e6:9.3f} ms  (n={result['samples']})")
+
+
+# 进程池工作进程中的SM2实例, 由 _pool_worker_init 创建
+_worker_sm2 = None
+
+
+# 工作进程初始化: 加载(或构建)G的预计算表, 之后的任务直接复用
+def _pool_worker_init(table_path, backend):
+    global _worker_sm2
+    _worker_sm2 = SM2_Optimized(backend)
+    if table_path:
+        _worker_sm2.load_g_table(table_path)
+    else:
+        _worker_sm2._get_g_table()
+
+
+def _pool_sign_chunk(private_key, ID, msgs):
+    return _worker_sm2.sign_many(private_key, msgs, ID)
+
+
+def _pool_verify_chunk(items):
+    return _worker_sm2.verify_batch(items)
+
+
+def _pool_decrypt_chunk(private_key, ciphertexts):
+    return _worker_sm2.decrypt_many(private_key, ciphertexts)
+
+
+# 多进程批量签名/验签/解密执行器: 绕过GIL利用多核
+# 每个工作进程在启动时准备一次预计算表(指定table_path时以mmap加载, 多个进程共享页面),
+# 任务按块分发以摊薄进程间通信开销, 结果按输入顺序返回
+class SM2Pool:
+    def __init__(self, max_workers=None, chunk_size=None, table_path=None, backend=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        # 优先使用fork, 子进程直接继承已加载的模块
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork') if 'fork' in methods else None
+        self._executor = ProcessPoolExecutor(self.max_workers, mp_context=context,
+                                             initializer=_pool_worker_init, initargs=(table_path, backend))
+
+    # 按块切分输入; 未指定块大小时让每个进程约分到4块
+    def _chunks(self, items):
+        size = self.chunk_size or max(1, min(POOL_MAX_CHUNK, -(-len(items) // (self.max_workers * 4))))
+        return [items[i:i + size] for i in range(0, len(items), size)]
+
+    # 分块提交并按顺序拼接结果
+    def _run(self, fn, chunks, *args):
+        futures = [self._executor.submit(fn, *args, chunk) for chunk in chunks]
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        return results
+
+    def sign_many(self, private_key, msgs, ID=b'1234567812345678'):
+        return self._run(_pool_sign_chunk, self._chunks(list(msgs)), private_key, ID)
+
+    def verify_many(self, items):
+        return self._run(_pool_verify_chunk, self._chunks(list(items)))
+
+    def decrypt_many(self, private_key, ciphertexts):
+        return self._run(_pool_decrypt_chunk, self._chunks(list(ciphertexts)), private_key)
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# 导入时加载持久化的基点G预计算表; 文件不可用时退回首次使用时构建
+if os.environ.get(G_TABLE_ENV):
+    try:
+        SM2_Optimized().load_g_table(os.environ[G_TABLE_ENV])
+    except (OSError, ValueError) as exc:
+        warnings.warn(f"无法加载G预计算表 {os.environ[G_TABLE_ENV]}: {exc}")
 
 
 # 测试
 if __name__ == "__main__":
-    message = "Hello World! This is SDU DUDU!" * 10
-
-    # 基本SM2测试
-    print("基本SM2算法:")
-    sm2_basic = SM2_Basic()
-    private_key, public_key = sm2_basic.generate_keypair()
-
-    # 加密
-    start = time.time()
-    ciphertext = sm2_basic.encrypt(public_key, message)
-    end = time.time()
-    print(f"基本SM2加密时间: {end - start:.4f} 秒")
-
-    # 解密
-    start = time.time()
-    decrypted = sm2_basic.decrypt(private_key, ciphertext)
-    end = time.time()
-    print(f"基本SM2解密时间: {end - start:.4f} 秒")
-
-    # 签名
-    start = time.time()
-    signature = sm2_basic.sign(private_key, message)
-    end = time.time()
-    print(f"基本SM2签名时间: {end - start:.4f} 秒")
-
-    # 验证
-    start = time.time()
-    is_valid = sm2_basic.verify(public_key, message, signature)
-    end = time.time()
-    print(f"基本SM2验证时间: {end - start:.4f} 秒")
-    print(f"基本SM2验证结果: {'成功' if is_valid else '失败'}\n")
-
-    # 优化SM2测试
-    print("优化SM2算法:")
-    sm2_optimized = SM2_Optimized()
-    private_key_opt, public_key_opt = sm2_optimized.generate_keypair()
-
-    # 加密
-    start = time.time()
-    ciphertext_opt = sm2_optimized.encrypt(public_key_opt, message)
-    end = time.time()
-    print(f"优化SM2加密时间: {end - start:.4f} 秒")
-
-    # 解密
-    start = time.time()
-    decrypted_opt = sm2_optimized.decrypt(private_key_opt, ciphertext_opt)
-    end = time.time()
-    print(f"优化SM2解密时间: {end - start:.4f} 秒")
-
-    # 签名
-    start = time.time()
-    signature_opt = sm2_optimized.sign(private_key_opt, message)
-    end = time.time()
-    print(f"优化SM2签名时间: {end - start:.4f} 秒")
-
-    # 验证
-    start = time.time()
-    is_valid_opt = sm2_optimized.verify(public_key_opt, message, signature_opt)
-    end = time.time()
-    print(f"优化SM2验证时间: {end - start:.4f} 秒")
-    print(f"优化SM2验证结果: {'成功' if is_valid_opt else '失败'}")
-
-    # 验证解密结果
-    assert decrypted == message.encode(), "基本SM2解密结果与原始消息不一致"
-    assert decrypted_opt == message.encode(), "优化SM2解密结果与原始消息不一致"
-    print("\n所有测试验证成功!")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="SM2 基准测试")
+    parser.add_argument('--engines', nargs='+', choices=list(BENCH_ENGINES), help="参与测试的实现, 缺省为全部")
+    parser.add_argument('--ops', nargs='+', choices=BENCH_OPS, default=list(BENCH_OPS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(BENCH_SIZES), help="消息长度(字节)")
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=30, help="每个用例的最大采样次数")
+    parser.add_argument('--max-seconds', type=float, default=2.0, help="每个用例的采样时间上限(秒)")
+    parser.add_argument('--quick', action='store_true', help="快速模式: 只测32B与1KB消息, 采样5次")
+    parser.add_argument('--json', help="将结果写入JSON文件")
+    parser.add_argument('--baseline', help="与该JSON基线比较, 有退化时以状态码1退出")
+    parser.add_argument('--threshold', type=float, default=BENCH_REGRESSION_THRESHOLD,
+                        help="退化阈值(p50变慢的比例)")
+    parser.add_argument('--profile', action='store_true', help="输出签名与解密的运算计数")
+    args = parser.parse_args()
+    if args.quick:
+        args.sizes, args.warmup, args.repeat = [32, 1 << 10], 1, 5
+
+    # 正确性检查: 各实现加解密往返, 且签名可被其他实现验证
+    message = b"Hello World! This is SDU DUDU!" * 10
+    engines = [BENCH_ENGINES[name][0]() for name in (args.engines or BENCH_ENGINES)]
+    for sm2 in engines:
+        private_key, public_key = sm2.generate_keypair()
+        assert sm2.decrypt(private_key, sm2.encrypt(public_key, message)) == message, \
+            f"{type(sm2).__name__}解密结果与原始消息不一致"
+        signature = sm2.sign(private_key, message)
+        for other in engines:
+            assert other.verify(public_key, message, signature), f"{type(other).__name__}验证签名失败"
+        # 无穷远点的编码 04∥0^64 必须被拒绝: 否则 d*C1 与私钥无关, 攻击者可构造任意私钥都能"解密"的密文
+        if hasattr(sm2, 'decode_point'):
+            zero_point = bytes([0x04]) + bytes(64)
+            forged = zero_point + hashlib.new('sm3', message + zero_point).digest() \
+                + _xor_bytes(message, sm2._kdf(zero_point, len(message)))
+            for reject in (lambda: sm2.decrypt(private_key, forged), lambda: sm2.decrypt_many(private_key, [forged]),
+                           lambda: sm2.deserialize_public_key(zero_point)):
+                try:
+                    reject()
+                except ValueError:
+                    continue
+                raise AssertionError(f"{type(sm2).__name__}接受了无穷远点编码")
+    print("所有测试验证成功!\n")
+
+    report = run_benchmarks(args.engines, args.ops, args.sizes, args.warmup, args.repeat,
+                            max_seconds=args.max_seconds, progress=_print_bench_result)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n结果已写入 {args.json}")
+
+    # 运算计数: 每次调用平均的点运算、域乘法、模逆次数
+    if args.profile:
+        print("\n运算计数(平均每次调用):")
+        for sm2 in engines:
+            private_key, public_key = sm2.generate_keypair()
+            ciphertext = sm2.encrypt(public_key, message)
+            with instrument(sm2) as stats:
+                sm2.sign(private_key, message)
+                sm2.decrypt(private_key, ciphertext)
+            for api, record in stats.per_call().items():
+                ops = ", ".join(f"{op} {count:.0f}" for op, count in sorted(record['ops'].items()))
+                print(f"{type(sm2).__name__}.{api}: {ops}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        comparisons = compare_benchmarks(report, baseline, args.threshold)
+        print(f"\n与基线比较(p50, 阈值 {args.threshold:.0%}):")
+        for c in comparisons:
+            size = '-' if c['op'] == 'keygen' else _format_size(c['size'])
+            flag = "  <-- 退化" if c['regression'] else ""
+            print(f"{c['engine']:<22} {c['op']:<8} {size:>6} {c['baseline_p50_ns'] / 1e6:9.3f} ms -> "
+                  f"{c['current_p50_ns'] / 1e6:9.3f} ms ({c['change']:+.1%}){flag}")
+        regressions = [c for c in comparisons if c['regression']]
+        if regressions:
+            print(f"\n发现 {len(regressions)} 项性能退化")
+            sys.exit(1)
@@ -0,0 +1,320 @@
+import os
+import sys
+import time
+import random
+import struct
+import asyncio
+import argparse
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+
+# 加载同目录下的SM2实现(文件名不是合法的模块名, 需按路径加载)
+_spec = importlib.util.spec_from_file_location(
+    "sm2_impl", os.path.join(os.path.dirname(os.path.abspath(__file__)), "5.1sm2实现与优化.py"))
+sm2_impl = importlib.util.module_from_spec(_spec)
+sys.modules["sm2_impl"] = sm2_impl
+_spec.loader.exec_module(sm2_impl)
+
+# 帧格式: 长度(4字节, 不含自身) ∥ 请求编号(4字节) ∥ 操作码/状态(1字节) ∥ 负载
+FRAME_HEADER = struct.Struct('>IIB')
+MAX_FRAME_SIZE = 16 << 20
+
+# 操作码
+OP_SIGN = 1    # 负载: 消息; 使用服务端密钥签名, 响应负载为64字节签名
+OP_VERIFY = 2  # 负载: 公钥x∥y(64) ∥ 签名(64) ∥ ID长度(2) ∥ ID ∥ 消息; 响应负载为1字节结果
+
+# 响应状态
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+# 默认的微批参数: 最多等待1毫秒或凑满256条即提交一批
+BATCH_WINDOW = 0.001
+BATCH_MAX_ITEMS = 256
+
+
+# 读取一帧, 连接关闭时返回None
+async def read_frame(reader):
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None
+    length, request_id, code = FRAME_HEADER.unpack(header)
+    if length < FRAME_HEADER.size - 4 or length > MAX_FRAME_SIZE:
+        raise ValueError("Invalid frame length")
+    payload = await reader.readexactly(length - (FRAME_HEADER.size - 4))
+    return request_id, code, payload
+
+
+def pack_frame(request_id, code, payload):
+    return FRAME_HEADER.pack(len(payload) + FRAME_HEADER.size - 4, request_id, code) + payload
+
+
+def pack_verify_payload(public_key, msg, signature, ID=b'1234567812345678'):
+    return (public_key[0].to_bytes(32, 'big') + public_key[1].to_bytes(32, 'big') + signature
+            + len(ID).to_bytes(2, 'big') + ID + msg)
+
+
+def unpack_verify_payload(payload):
+    if len(payload) < 130:
+        raise ValueError("Invalid verify request")
+    public_key = (int.from_bytes(payload[:32], 'big'), int.from_bytes(payload[32:64], 'big'))
+    signature = payload[64:128]
+    id_len = int.from_bytes(payload[128:130], 'big')
+    ID = payload[130:130 + id_len]
+    if len(ID) != id_len:
+        raise ValueError("Invalid verify request")
+    return public_key, payload[130 + id_len:], signature, ID
+
+
+# 微批处理: 收集一个时间窗口内(或凑满max_items条)的并发请求, 交给执行器一次性批量处理
+class MicroBatcher:
+    def __init__(self, handler, executor, window=BATCH_WINDOW, max_items=BATCH_MAX_ITEMS):
+        self.handler = handler  # 接收条目列表, 返回同顺序的结果列表
+        self.executor = executor
+        self.window = window
+        self.max_items = max_items
+        self._pending = []
+        self._timer = None
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_items:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending:
+            batch, self._pending = self._pending, []
+            asyncio.get_running_loop().create_task(self._run(batch))
+
+    async def _run(self, batch):
+        self.batches += 1
+        self.items += len(batch)
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.executor, self.handler, [item for item, _ in batch])
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+# SM2签名/验签服务
+# workers为0时在后台线程中调用单进程批量接口; 大于0时通过SM2Pool分发到多个进程
+# 签名与验签各用一个执行器, 互不排队; 使用进程池时每个执行器有workers个线程, 可同时向进程池提交多批
+class SM2Server:
+    def __init__(self, private_key=None, ID=b'1234567812345678', workers=0, table_path=None,
+                 window=BATCH_WINDOW, max_items=BATCH_MAX_ITEMS):
+        self.sm2 = sm2_impl.SM2_Optimized()
+        if table_path:
+            self.sm2.load_g_table(table_path)
+        if private_key is None:
+            private_key, _ = self.sm2.generate_keypair()
+        self.signing_key = self.sm2.signing_key(private_key, ID)
+        self.pool = sm2_impl.SM2Pool(workers, table_path=table_path) if workers > 0 else None
+        threads = max(1, workers) if self.pool is not None else 1
+        self.sign_executor = ThreadPoolExecutor(threads)
+        self.verify_executor = ThreadPoolExecutor(threads)
+
+        if self.pool is not None:
+            sign_handler = lambda msgs: self.pool.sign_many(private_key, msgs, ID)
+            verify_handler = self.pool.verify_many
+        else:
+            sign_handler = self.signing_key.sign_many
+            verify_handler = self.sm2.verify_batch
+        self.sign_batcher = MicroBatcher(sign_handler, self.sign_executor, window, max_items)
+        self.verify_batcher = MicroBatcher(verify_handler, self.verify_executor, window, max_items)
+
+    @property
+    def public_key(self):
+        return self.signing_key.public_key
+
+    # 处理单个连接: 每个请求一个任务, 同一连接上的请求可流水线发送, 响应按请求编号匹配
+    async def handle_connection(self, reader, writer):
+        tasks = set()
+        try:
+            while True:
+                frame = await read_frame(reader)
+                if frame is None:
+                    break
+                task = asyncio.create_task(self._handle_request(writer, *frame))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (ValueError, ConnectionError):
+            pass
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+
+    async def _handle_request(self, writer, request_id, op, payload):
+        try:
+            if op == OP_SIGN:
+                response = await self.sign_batcher.submit(payload)
+            elif op == OP_VERIFY:
+                result = await self.verify_batcher.submit(unpack_verify_payload(payload))
+                response = b'\x01' if result else b'\x00'
+            else:
+                raise ValueError("Unknown operation")
+            writer.write(pack_frame(request_id, STATUS_OK, response))
+        except Exception as exc:
+            writer.write(pack_frame(request_id, STATUS_ERROR, str(exc).encode()))
+        await writer.drain()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.sign_executor.shutdown()
+        self.verify_executor.shutdown()
+        if self.pool is not None:
+            self.pool.close()
+
+
+# 压测客户端的单个连接: 同时保持inflight个未完成请求
+class _BenchConnection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.waiters = {}
+        self.next_id = 0
+
+    async def receive_loop(self):
+        while True:
+            frame = await read_frame(self.reader)
+            if frame is None:
+                break
+            request_id, status, payload = frame
+            future = self.waiters.pop(request_id, None)
+            if future is not None:
+                future.set_result((status, payload))
+
+    async def request(self, op, payload):
+        self.next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self.waiters[self.next_id] = future
+        self.writer.write(pack_frame(self.next_id, op, payload))
+        await self.writer.drain()
+        return await future
+
+
+# 异步压测: 统计吞吐量与延迟分位数
+async def run_benchmark(host, port, op='verify', requests=2000, connections=8, inflight=16, msg_size=64):
+    # 验签请求需要有效签名: 在本地预先生成一组签名
+    sm2 = sm2_impl.SM2_Optimized()
+    signing_key = sm2.signing_key(sm2.generate_keypair()[0])
+    msgs = [random.randbytes(msg_size) for _ in range(min(requests, 256))]
+    if op == 'verify':
+        signatures = signing_key.sign_many(msgs)
+        payloads = [pack_verify_payload(signing_key.public_key, m, s) for m, s in zip(msgs, signatures)]
+        opcode = OP_VERIFY
+    else:
+        payloads = msgs
+        opcode = OP_SIGN
+
+    conns = []
+    for _ in range(connections):
+        reader, writer = await asyncio.open_connection(host, port)
+        conns.append(_BenchConnection(reader, writer))
+    receivers = [asyncio.create_task(c.receive_loop()) for c in conns]
+
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker(conn):
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter_ns()
+            status, payload = await conn.request(opcode, payloads[i % len(payloads)])
+            latencies.append(time.perf_counter_ns() - start)
+            if status != STATUS_OK or (opcode == OP_VERIFY and payload != b'\x01'):
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(c) for c in conns for _ in range(inflight)))
+    elapsed = time.perf_counter() - start
+
+    for c in conns:
+        c.writer.close()
+    for task in receivers:
+        task.cancel()
+
+    latencies.sort()
+
+    def percentile(q):
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] / 1e6
+
+    return {
+        'op': op,
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': elapsed,
+        'throughput': len(latencies) / elapsed,
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SM2 异步签名/验签服务与压测客户端")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    serve = sub.add_parser('serve', help="启动服务")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8802)
+    serve.add_argument('--private-key', help="签名私钥(十六进制), 缺省时随机生成")
+    serve.add_argument('--workers', type=int, default=0, help="进程池大小, 0表示单进程")
+    serve.add_argument('--table', help="G预计算表文件(mmap加载)")
+    serve.add_argument('--window-ms', type=float, default=BATCH_WINDOW * 1000, help="微批等待时间(毫秒)")
+    serve.add_argument('--max-batch', type=int, default=BATCH_MAX_ITEMS, help="每批最多条目数")
+
+    bench = sub.add_parser('bench', help="压测")
+    bench.add_argument('--host', default='127.0.0.1')
+    bench.add_argument('--port', type=int, default=8802)
+    bench.add_argument('--op', choices=['sign', 'verify'], default='verify')
+    bench.add_argument('--requests', type=int, default=2000)
+    bench.add_argument('--connections', type=int, default=8)
+    bench.add_argument('--inflight', type=int, default=16, help="每个连接同时未完成的请求数")
+    bench.add_argument('--msg-size', type=int, default=64)
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        private_key = int(args.private_key, 16) if args.private_key else None
+        server = SM2Server(private_key, workers=args.workers, table_path=args.table,
+                           window=args.window_ms / 1000, max_items=args.max_batch)
+        x, y = server.public_key
+        print(f"SM2服务监听 {args.host}:{args.port}")
+        print(f"签名公钥: 04{x:064x}{y:064x}")
+        try:
+            asyncio.run(server.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+    else:
+        result = asyncio.run(run_benchmark(args.host, args.port, args.op, args.requests,
+                                           args.connections, args.inflight, args.msg_size))
+        print(f"操作: {result['op']}, 请求数: {result['requests']}, 错误: {result['errors']}")
+        print(f"吞吐量: {result['throughput']:.1f} 次/秒 (耗时 {result['seconds']:.3f} 秒)")
+        print(f"延迟: p50 {result['p50_ms']:.2f} ms, p95 {result['p95_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,16 @@
+import os
+import sys
 import math
 from math import gcd
 import hashlib
 
-# SM2参数 (256位素数域)
-p = 0x8542D69E4C044F18E8B92435BF6FF7DE457283915C45517D722EDB8B08F1DFC3
-a = 0x787968B4FA32C3FD2417842E73BBFEFF2F3C848B6831D7E0EC65228B3937E498
-b = 0x63E4C6D3B23B0C849CF84241484BFE48F61D59A5B16BA06E6E12D1DA27C5249A
-n = 0x8542D69E4C044F18E8B92435BF6FF7DD297720630485628D5AE74EE7C32E79B7
-Gx = 0x421DEBD61B62EAB6746434EBC3CC315E32220B3BADD50BDC4C4E6C147FEDD43D
-Gy = 0x0680512BCBB42C07D47349D2153B70C4E5D7FDFCBFA36EA1A85841B9E46E09A2
+# 通用曲线引擎位于上一级目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ec_engine import get_engine
+
+# SM2参数 (256位素数域测试曲线), 点运算由曲线引擎完成(雅可比坐标 + 窗口点乘)
+engine = get_engine('sm2-test')
+n = engine.n
 
 def generate(m, n):  # 从 m 生成一个椭圆曲线签名所需的整数 e
     tmp = hashlib.sha256(m.encode()).digest()
@@ -19,46 +21,14 @@ def mul_inv(a, m):  # 计算 a 在模 m 下的乘法逆元
         return None
     return pow(a, -1, m)
 
-def add(m, n):  # 曲线上的点加算法
-    temp = []
-    if m == 0:
-        return n
-    if n == 0:
-        return m
-    if m != n:
-        denominator = (m[0] - n[0]) % p
-        if denominator == 0:
-            return 0
-        k = ((m[1] - n[1]) * mul_inv(denominator, p)) % p
-    else:
-        denominator = (2 * m[1]) % p
-        if denominator == 0:
-            return 0
-        k = ((3 * (m[0] ** 2) + a) * mul_inv(denominator, p)) % p
-    x = (k ** 2 - m[0] - n[0]) % p
-    y = (k * (m[0] - x) - m[1]) % p
-    temp.append(x)
-    temp.append(y)
-    return temp
-
-def p_mul_n(n, point):  # 椭圆曲线标量乘法
-    result = 0
-    temp = point.copy()
-    while n > 0:
-        if n % 2 == 1:
-            result = add(result, temp)
-        temp = add(temp, temp)
-        n = n // 2
-    return result
-
 def ECDSA_sign(private_key, msg, k, e, n, G):  # ECDSA 签名生成
-    R = p_mul_n(k, G)  # 临时公钥 R = k * G
+    R = engine.point_mul(k, G)  # 临时公钥 R = k * G
     r = R[0] % n
     s = (mul_inv(k, n) * (e + private_key * r)) % n
     return r, s
 
 def Schnorr_sign(msg, private_key, k, n, G):  # Schnorr 签名生成
-    r = p_mul_n(k, G)  # 临时公钥计算
+    r = engine.point_mul(k, G)  # 临时公钥计算
     e = int(hashlib.sha256((str(r[0]) + msg).encode()).hexdigest(), 16) % n
     s = (k + e * private_key) % n
     return r, s, e
@@ -75,7 +45,7 @@ if __name__ == '__main__':
     e1 = generate(m1, n)
     e2 = generate(m2, n)
 
-    G = [Gx, Gy]  # 基点 G
+    G = engine.G  # 基点 G
 
     print("测试信息：")
     print(f"d1 = {d1}, d2 = {d2}")
@@ -83,7 +53,7 @@ if __name__ == '__main__':
 
     # 泄露 k 导致泄露 d1
     print("泄露 k 会导致泄露 d1：")
-    R = p_mul_n(k, G)
+    R = engine.point_mul(k, G)
     r1 = R[0] % n
     s1 = (mul_inv(k, n) * (e1 + d1 * r1)) % n
     d_recovered = (mul_inv(r1, n) * (k * s1 - e1)) % n
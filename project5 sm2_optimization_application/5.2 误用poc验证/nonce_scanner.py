@@ -0,0 +1,317 @@
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+# 通用曲线引擎位于上一级目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ec_engine import CURVES, get_engine
+
+# 大规模签名日志的随机数重用扫描与私钥恢复
+# 记录格式: 每行 "公钥 r s e" (十六进制, 空格或逗号分隔, 可带0x前缀), '#' 开头的行为注释
+# 1. 分片: 单遍读取输入, 按随机数标识(ECDSA为r, SM2为 (r - e) mod n)散列写入分片文件;
+# 2. 分组: 各分片独立在内存中找出重复的随机数标识(可多进程并行), 内存占用只与单个分片大小有关;
+# 3. 恢复: 在所有重复组上迭代求解随机数k与私钥d, 每轮需要的模逆通过Montgomery技巧共用一次模逆;
+# 4. 校验: 公钥可解码时检查 d*G 与公钥一致。
+# 注意: ECDSA签名若经过low-s规范化(s替换为n - s), 对应的随机数变为-k, 这类签名需先还原原始s
+
+SCHEMES = ('ecdsa', 'sm2')
+# 默认分片数与每个分片文件的写缓冲
+DEFAULT_SHARDS = 64
+SHARD_BUFFER_SIZE = 1 << 16
+
+
+# 解析一行记录, 返回 (公钥, r, s, e), 空行、注释与格式错误的行返回None
+def parse_record(line):
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    fields = line.replace(',', ' ').split()
+    if len(fields) != 4:
+        return None
+    try:
+        r, s, e = (int(field, 16) for field in fields[1:])
+    except ValueError:
+        return None
+    return fields[0].lower(), r, s, e
+
+
+# 签名所用随机数的标识: 随机数k相同的签名标识相同
+# ECDSA: r = x(kG) mod n; SM2: r = e + x(kG) mod n, 因此 (r - e) mod n 只取决于k
+def nonce_id(record, scheme, n):
+    _, r, s, e = record
+    if scheme == 'ecdsa':
+        return r % n
+    return (r - e) % n
+
+
+# 批量模逆(Montgomery技巧): 前缀积 + 一次模逆 + 反向回代, values中不能有0
+def batch_inverse(values, n):
+    prefix = []
+    acc = 1
+    for v in values:
+        prefix.append(acc)
+        acc = acc * v % n
+    inv = pow(acc, -1, n)
+    result = [0] * len(values)
+    for i in range(len(values) - 1, -1, -1):
+        result[i] = inv * prefix[i] % n
+        inv = inv * values[i] % n
+    return result
+
+
+# 第1步: 单遍读取所有输入, 按随机数标识写入shards个分片文件, 返回分片路径与记录数
+def partition(paths, workdir, shards, scheme, n):
+    shard_paths = [os.path.join(workdir, f"shard-{i:04d}.txt") for i in range(shards)]
+    files = [open(path, 'w', buffering=SHARD_BUFFER_SIZE) for path in shard_paths]
+    count = 0
+    try:
+        for path in paths:
+            with open(path, encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    record = parse_record(line)
+                    if record is None:
+                        continue
+                    public_key, r, s, e = record
+                    # 标识在[0, n)内近似均匀分布, 直接取模即可均匀分片
+                    files[nonce_id(record, scheme, n) % shards].write(f"{public_key} {r:x} {s:x} {e:x}\n")
+                    count += 1
+    finally:
+        for f in files:
+            f.close()
+    return shard_paths, count
+
+
+# 第2步: 找出一个分片中随机数标识重复的签名组
+# 先只统计每个标识出现的次数, 再读一遍只保留重复标识的记录, 完全相同的记录只保留一条
+def find_groups(shard_path, scheme, n):
+    counts = {}
+    with open(shard_path) as f:
+        for line in f:
+            key = nonce_id(parse_record(line), scheme, n)
+            counts[key] = counts.get(key, 0) + 1
+    repeated = {key for key, count in counts.items() if count > 1}
+    del counts
+
+    groups = {}
+    if repeated:
+        with open(shard_path) as f:
+            for line in f:
+                record = parse_record(line)
+                key = nonce_id(record, scheme, n)
+                if key in repeated:
+                    groups.setdefault(key, set()).add(record)
+    return {key: sorted(records) for key, records in groups.items() if len(records) > 1}
+
+
+# 第3步: 在所有重复组上迭代恢复随机数与私钥, 返回 ({公钥: d}, {随机数标识: k})
+# ECDSA: s = k^-1 (e + d*r)
+#   同一公钥的两条签名: k = (e1 - e2) / (s1 - s2); 已知k: d = (s*k - e) / r; 已知d: k = (e + d*r) / s
+# SM2: s = (1 + d)^-1 (k - r*d)
+#   同一公钥的两条签名: d = (s1 - s2) / (s2 + r2 - s1 - r1); 已知k: d = (k - s) / (s + r); 已知d: k = s + (s + r) * d
+# 一个私钥被恢复后, 它在其他组中的签名又能给出该组的k, 从而牵连组内的其他公钥, 因此迭代到不再有新结果为止
+def recover(groups, scheme, n):
+    keys = {}
+    nonces = {}
+    changed = True
+    while changed:
+        changed = False
+
+        # 同一公钥在同一组中的两条签名直接给出k(SM2给出d)
+        pairs = []
+        for gid, records in groups.items():
+            if gid in nonces:
+                continue
+            first = {}
+            for record in records:
+                public_key, r, s, e = record
+                other = first.setdefault(public_key, record)
+                if other is record:
+                    continue
+                _, r1, s1, e1 = other
+                if scheme == 'ecdsa':
+                    num, den = e1 - e, s1 - s
+                else:
+                    num, den = s1 - s, s + r - s1 - r1
+                if den % n:
+                    pairs.append((gid, other, num % n, den % n))
+                    break
+        for (gid, record, num, den), inv in zip(pairs, batch_inverse([den for *_, den in pairs], n)):
+            public_key, r, s, e = record
+            if scheme == 'ecdsa':
+                nonces[gid] = num * inv % n
+            else:
+                d = num * inv % n
+                keys.setdefault(public_key, d)
+                nonces[gid] = (s + (s + r) * d) % n
+            changed = True
+
+        # 已知私钥的签名给出所在组的k
+        pending = []
+        for gid, records in groups.items():
+            if gid in nonces:
+                continue
+            for record in records:
+                public_key, r, s, e = record
+                if public_key in keys:
+                    if scheme == 'sm2':
+                        nonces[gid] = (s + (s + r) * keys[public_key]) % n
+                        changed = True
+                    elif s % n:
+                        pending.append((gid, record))
+                    break
+        for (gid, (public_key, r, s, e)), inv in zip(pending, batch_inverse([s for _, (_, r, s, e) in pending], n)):
+            nonces[gid] = (e + keys[public_key] * r) * inv % n
+            changed = True
+
+        # 已知k的组中, 其余公钥的私钥
+        pending = []
+        solving = set()
+        for gid, records in groups.items():
+            if gid not in nonces:
+                continue
+            for record in records:
+                public_key, r, s, e = record
+                if public_key in keys or public_key in solving:
+                    continue
+                den = r % n if scheme == 'ecdsa' else (s + r) % n
+                if den:
+                    pending.append((gid, record))
+                    solving.add(public_key)
+        dens = [r if scheme == 'ecdsa' else s + r for _, (_, r, s, e) in pending]
+        for (gid, (public_key, r, s, e)), inv in zip(pending, batch_inverse([d % n for d in dens], n)):
+            k = nonces[gid]
+            num = s * k - e if scheme == 'ecdsa' else k - s
+            keys[public_key] = num * inv % n
+            changed = True
+    return keys, nonces
+
+
+# 第4步: 用 d*G 校验恢复出的私钥, 公钥无法按曲线解码时返回None
+def verify_key(engine, public_key, d):
+    try:
+        point = engine.decode_point(bytes.fromhex(public_key))
+    except ValueError:
+        return None
+    return engine.point_mul_base(d) == point
+
+
+def _find_groups_task(args):
+    return find_groups(*args)
+
+
+# 扫描签名日志, 返回报告字典
+def scan(paths, scheme='ecdsa', curve='secp256k1', shards=DEFAULT_SHARDS, workers=1, workdir=None):
+    engine = get_engine(curve)
+    n = engine.n
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(dir=workdir, prefix='nonce-scan-') as tmp:
+        shard_paths, count = partition(paths, tmp, shards, scheme, n)
+        tasks = [(path, scheme, n) for path in shard_paths]
+        groups = {}
+        if workers > 1:
+            with ProcessPoolExecutor(workers) as executor:
+                for result in executor.map(_find_groups_task, tasks):
+                    groups.update(result)
+        else:
+            for task in tasks:
+                groups.update(_find_groups_task(task))
+
+    keys, nonces = recover(groups, scheme, n)
+    signatures = {}
+    for records in groups.values():
+        for public_key, *_ in records:
+            signatures[public_key] = signatures.get(public_key, 0) + 1
+    compromised = [{
+        'public_key': public_key,
+        'private_key': f"{d:x}",
+        'verified': verify_key(engine, public_key, d),
+        'reused_signatures': signatures[public_key],
+    } for public_key, d in sorted(keys.items())]
+    return {
+        'scheme': scheme,
+        'curve': curve,
+        'records': count,
+        'reused_nonce_groups': len(groups),
+        'reused_signatures': sum(len(records) for records in groups.values()),
+        'recovered_nonces': len(nonces),
+        'compromised_keys': compromised,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+# 生成测试用签名日志: 大部分记录为随机值, 其中混入若干组真实签名,
+# 每组由1~3个密钥用同一个k签名, 且每组至少有一个密钥用该k签了两条消息
+def generate_log(path, records, scheme='ecdsa', curve='secp256k1', reuse_groups=10, seed=None):
+    rng = random.Random(seed)
+    engine = get_engine(curve)
+    n = engine.n
+    lines = []
+    for _ in range(reuse_groups):
+        k = rng.randrange(1, n)
+        x1 = engine.point_mul_base(k)[0]
+        signers = [rng.randrange(1, n) for _ in range(rng.randint(1, 3))]
+        for i, d in enumerate(signers):
+            public_key = engine.encode_point(engine.point_mul_base(d), compressed=True).hex()
+            for _ in range(2 if i == 0 else 1):
+                e = int.from_bytes(hashlib.sha256(rng.randbytes(16)).digest(), 'big') % n
+                if scheme == 'ecdsa':
+                    r = x1 % n
+                    s = pow(k, -1, n) * (e + d * r) % n
+                else:
+                    r = (e + x1) % n
+                    s = pow(1 + d, -1, n) * (k - r * d) % n
+                lines.append(f"{public_key} {r:x} {s:x} {e:x}")
+    size = (n.bit_length() + 7) // 8
+    while len(lines) < records:
+        lines.append(f"{rng.randbytes(33).hex()} {rng.randrange(n):x} {rng.randrange(n):x} "
+                     f"{int.from_bytes(rng.randbytes(size), 'big') % n:x}")
+    rng.shuffle(lines)
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="签名日志随机数重用扫描与私钥恢复")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    scan_parser = sub.add_parser('scan', help="扫描签名日志")
+    scan_parser.add_argument('paths', nargs='+', help="签名日志文件")
+    scan_parser.add_argument('--scheme', choices=SCHEMES, default='ecdsa')
+    scan_parser.add_argument('--curve', choices=list(CURVES), default='secp256k1')
+    scan_parser.add_argument('--shards', type=int, default=DEFAULT_SHARDS, help="分片数, 越大单个分片占用内存越少")
+    scan_parser.add_argument('--workers', type=int, default=1, help="并行处理分片的进程数")
+    scan_parser.add_argument('--workdir', help="分片临时文件目录")
+    scan_parser.add_argument('--output', help="将报告写入JSON文件")
+
+    gen_parser = sub.add_parser('generate', help="生成测试用签名日志")
+    gen_parser.add_argument('path')
+    gen_parser.add_argument('--records', type=int, default=100000)
+    gen_parser.add_argument('--scheme', choices=SCHEMES, default='ecdsa')
+    gen_parser.add_argument('--curve', choices=list(CURVES), default='secp256k1')
+    gen_parser.add_argument('--reuse-groups', type=int, default=10)
+    gen_parser.add_argument('--seed', type=int)
+
+    args = parser.parse_args()
+    if args.command == 'generate':
+        generate_log(args.path, args.records, args.scheme, args.curve, args.reuse_groups, args.seed)
+        return
+
+    report = scan(args.paths, args.scheme, args.curve, args.shards, args.workers, args.workdir)
+    print(f"记录数: {report['records']}, 重复随机数组: {report['reused_nonce_groups']}, "
+          f"恢复随机数: {report['recovered_nonces']}, 耗时 {report['seconds']:.2f} 秒")
+    for item in report['compromised_keys']:
+        status = {True: "已校验", False: "校验失败", None: "未校验"}[item['verified']]
+        print(f"泄露私钥 [{status}] 公钥 {item['public_key']}: d = {item['private_key']}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
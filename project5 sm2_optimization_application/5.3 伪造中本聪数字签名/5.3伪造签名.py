@@ -1,70 +1,53 @@
-import math
+import os
+import sys
+import time
 import random
+import hashlib
+import argparse
 
+# 通用曲线引擎位于上一级目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ec_engine import INFINITY, get_engine
+from curve_validator import validate_curve
 
-# 辅助函数：生成与n互质的随机数
+# 中本聪的公钥(比特币创世区块coinbase输出中的未压缩公钥, secp256k1)
+SATOSHI_PUBLIC_KEY = ('04678afdb0fe5548271967f1a67130b7105cd6a828e03909a67962e0ea1f61deb6'
+                      '49f6bc3f4cef38c4f35504e51ec112de5c384df7ba0b8d578a4c702b6bf11d5f')
+
+
+# 辅助函数：生成与n互质的随机数(曲线参数已校验n为素数, [2, n-1]中的数均与n互质)
 def choose_random_coprime(n):
-    while True:
-        val = random.randint(2, n - 1)
-        if math.gcd(val, n) == 1:
-            return val
+    return random.randint(2, n - 1)
 
 
-# 曲线乘法逆元计算
+# 消息摘要: SHA-256, 结果与进程无关(内置hash()对字符串加盐随机化, 不同进程结果不同)
+def digest(m):
+    return int.from_bytes(hashlib.sha256(m.encode()).digest(), 'big')
+
+
+# 曲线乘法逆元计算(m为已校验的素数阶n, 只有0没有逆元)
 def mul_inv(a, m):
-    if math.gcd(a, m) != 1:
+    if a % m == 0:
         return None
     return pow(a, -1, m)
 
 
-# 曲线点加算法
-def add(m, n):
-    tmp = []
-    if (m == 0):
-        return n
-    if (n == 0):
-        return m  # 边界处理
-    if (m != n):
-        if (math.gcd(m[0] - n[0], p) != 1 and math.gcd(m[0] - n[0], p) != -1):
-            return 0
-        else:  # 斜率处理
-            k = ((m[1] - n[1]) * mul_inv(m[0] - n[0], p)) % p
-    else:
-        k = ((3 * (m[0] * m[0]) + a) * mul_inv(2 * m[1], p)) % p
-    x = (k * k - m[0] - n[0]) % p
-    y = (k * (m[0] - x) - m[1]) % p
-    tmp.append(x)
-    tmp.append(y)
-    return tmp
-
-
-# 曲线标量乘法
-def p_mul_n(n, p):
-    if n == 1:
-        return p
-    tmp = p
-    while (n >= 2):
-        tmp = add(tmp, p)
-        n = n - 1
-    return tmp
-
-
-# ECDSA签名算法
+# ECDSA签名算法(点运算由曲线引擎完成)
 def ECDSA_sign(m, n, G, d, k):
-    R = p_mul_n(k, G)
+    R = engine.point_mul(k, G)
     r = R[0] % n
-    e = hash(m)  # 摘要采用哈希生成
+    e = digest(m)  # 摘要采用SHA-256生成
     s = (mul_inv(k, n) * (e + d * r)) % n
     return r, s
 
 
 # ECDSA签名验证算法
 def ECDSA_ver(m, n, G, r, s, P):
-    e = hash(m)
+    e = digest(m)
     w = mul_inv(s, n)  # 本质为一种逆过程
     try:
-        w_point = add(p_mul_n((e * w) % n, G), p_mul_n((r * w) % n, P))
-        res = (w_point != 0) and (w_point[0] % n == r)
+        w_point = engine.dual_point_mul((e * w) % n, G, (r * w) % n, P)
+        res = (w_point != INFINITY) and (w_point[0] % n == r)
         return res
     except:
         print("模逆计算错误，请重试！")
@@ -75,8 +58,8 @@ def ver_no_m(e, n, G, r, s, P):
     w = mul_inv(s, n)
     v1 = (e * w) % n
     v2 = (r * w) % n
-    w_point = add(p_mul_n(v1, G), p_mul_n(v2, P))
-    if (w_point == 0):
+    w_point = engine.dual_point_mul(v1, G, v2, P)
+    if (w_point == INFINITY):
         print('失败')
         return False
     else:
@@ -87,10 +70,13 @@ def ver_no_m(e, n, G, r, s, P):
 
 # satoshi无消息签名算法
 def pretend(n, G, P):
-    u = choose_random_coprime(n)
-    v = choose_random_coprime(n)
-
-    R = add(p_mul_n(u, G), p_mul_n(v, P))[0]
+    # 小曲线上 R = x(uG + vP) 可能模n为0, 此时s1不可逆, 重新选取u、v
+    while True:
+        u = choose_random_coprime(n)
+        v = choose_random_coprime(n)
+        R = engine.dual_point_mul(u, G, v, P)[0]
+        if R % n != 0:
+            break
     e1 = (R * u * mul_inv(v, n)) % n
     s1 = (R * mul_inv(v, n)) % n
 
@@ -101,22 +87,38 @@ def pretend(n, G, P):
     ver_no_m(e1, n, G, R, s1, P)
 
 
-# 曲线参数(大参数运行时间太慢，改为小参数用于伪造)
-a = 1  # 曲线方程中的参数
-b = 1  # 曲线方程中的参数
-p = 23  # 有限域的大小，保持为质数
-G = [5, 1]  # 基点
-n = 21  # 曲线阶数，确保正确
-d = 7  # 模拟私钥
-k = choose_random_coprime(n)  # 随机数，用于签名
-P = p_mul_n(d, G)  # 计算公钥
+# 曲线引擎: 默认使用比特币的secp256k1, 也可选择小曲线 toy23 (y^2 = x^3 + x + 4 mod 23) 做实验
+# 小曲线由 get_engine 自动使用穷举查表引擎, 点运算均为查表
+engine = get_engine('secp256k1')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="ECDSA 无消息签名伪造")
+    parser.add_argument('--curve', choices=['secp256k1', 'toy23'], default='secp256k1')
+    args = parser.parse_args()
+
+    engine = get_engine(args.curve)
+    # 启动时校验一次曲线参数(G在曲线上、G的阶为素数n、余因子正确), 之后的循环中不再重复检查
+    validate_curve(engine.curve)
+    G = engine.G  # 基点
+    n = engine.n  # 基点的阶
+    d = choose_random_coprime(n)  # 模拟私钥
+    k = choose_random_coprime(n)  # 随机数，用于签名
+    P = engine.point_mul_base(d)  # 计算公钥
+
+    m1 = 'Hello World! This is SDU DUDU!'
 
-m1 = 'Hello World! This is SDU DUDU!'
+    # 计算签名
+    r, s = ECDSA_sign(m1, n, G, d, k)
+    print("签名结果为:", r, s)
+    print("验证结果为:", ECDSA_ver(m1, n, G, r, s, P), "\n")  # 签名正常验证，确保结果的有效性
 
-# 计算签名
-r, s = ECDSA_sign(m1, n, G, d, k)
-print("签名结果为:", r, s)
-print("验证结果为:", ECDSA_ver(m1, n, G, r, s, P), "\n")  # 签名正常验证，确保结果的有效性
+    # secp256k1上直接伪造中本聪公钥的签名, 小曲线上使用模拟公钥
+    if args.curve == 'secp256k1':
+        P = engine.decode_point(bytes.fromhex(SATOSHI_PUBLIC_KEY))
+        print("中本聪公钥:", SATOSHI_PUBLIC_KEY)
 
-print("伪装签名攻击：")
-pretend(n, G, P)  # 无消息签名伪造攻击实施
\ No newline at end of file
+    print("伪装签名攻击：")
+    start = time.perf_counter()
+    pretend(n, G, P)  # 无消息签名伪造攻击实施
+    print(f"伪造与验证耗时: {(time.perf_counter() - start) * 1000:.2f} ms")
\ No newline at end of file
@@ -0,0 +1,271 @@
+import math
+import random
+import argparse
+
+from ec_engine import CURVES, INFINITY, Curve, CurveEngine
+
+# 曲线参数校验: p为素数且曲线非奇异、G在曲线上、G的阶为素数n、余因子h满足 #E = n*h
+# G的阶: 在Hasse区间 [p+1-2√p, p+1+2√p] 上用大步小步法(BSGS)找出M使 M*G = O, 再分解M约化为精确阶,
+#        只需约 4*p^(1/4) 次点运算, 而逐个累加G需要 n 次; p更大时改为检查 n 为素数且 n*G = O
+# 群阶: n > 4√p 时由Hasse区间唯一确定, 否则对小p直接计点(对每个x统计 y^2 = x^3 + ax + b 的解数)
+# 校验通过的结果按曲线参数缓存, 同一组参数只校验一次
+
+# 可直接计点的最大p, 计点需要 O(p) 时间与内存
+POINT_COUNT_MAX_P = 1 << 20
+# 使用BSGS计算G的阶的最大p
+BSGS_MAX_P = 1 << 48
+# Miller-Rabin测试使用的底数: 前20个素数
+# 其中前13个(2~41)已对 3.3*10^24 以下的整数给出确定性结果, 这20个底数能给出的确定性界也只到这里;
+# 更大的整数(如256位的p、n)为概率性测试, 合数通过单个底数的概率不超过1/4, 20个底数的误判率约为 4^-20
+MILLER_RABIN_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61, 67, 71)
+
+# 已通过校验的曲线: 曲线参数 -> 校验结果
+_validated = {}
+
+
+# Miller-Rabin素性测试
+def is_probable_prime(m):
+    if m < 2:
+        return False
+    for q in MILLER_RABIN_BASES:
+        if m % q == 0:
+            return m == q
+    d, s = m - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    for a in MILLER_RABIN_BASES:
+        x = pow(a, d, m)
+        if x == 1 or x == m - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % m
+            if x == m - 1:
+                break
+        else:
+            return False
+    return True
+
+
+# Pollard rho(Brent变体)找出合数m的一个非平凡因子
+def _pollard_rho(m):
+    if m % 2 == 0:
+        return 2
+    while True:
+        y, c = random.randrange(1, m), random.randrange(1, m)
+        g, r, q = 1, 1, 1
+        while g == 1:
+            x = y
+            for _ in range(r):
+                y = (y * y + c) % m
+            k = 0
+            while k < r and g == 1:
+                ys = y
+                for _ in range(min(128, r - k)):
+                    y = (y * y + c) % m
+                    q = q * abs(x - y) % m
+                g = math.gcd(q, m)
+                k += 128
+            r *= 2
+        if g == m:
+            g = 1
+            while g == 1:
+                ys = (ys * ys + c) % m
+                g = math.gcd(abs(x - ys), m)
+        if g != m:
+            return g
+
+
+# 分解m的素因子, 返回 {素数: 指数}
+def factorize(m):
+    factors = {}
+    for q in (2, 3, 5, 7, 11, 13):
+        while m % q == 0:
+            factors[q] = factors.get(q, 0) + 1
+            m //= q
+    stack = [m] if m > 1 else []
+    while stack:
+        m = stack.pop()
+        if is_probable_prime(m):
+            factors[m] = factors.get(m, 0) + 1
+            continue
+        d = _pollard_rho(m)
+        stack += [d, m // d]
+    return factors
+
+
+# Hasse区间 [p+1-2√p, p+1+2√p] 的上下界(取整后向外放宽)
+def hasse_interval(p):
+    width = math.isqrt(4 * p) + 1
+    return max(1, p + 1 - width), p + 1 + width
+
+
+# 计点: #E = 1 + Σ_x (方程 y^2 = x^3 + ax + b 的解数)
+def count_points(curve):
+    p = curve.p
+    if p > POINT_COUNT_MAX_P:
+        raise ValueError("p is too large for point counting")
+    # roots[v] 为 y^2 ≡ v (mod p) 的解数
+    roots = [0] * p
+    for y in range(p):
+        roots[y * y % p] += 1
+    return 1 + sum(roots[(x * x * x + curve.a * x + curve.b) % p] for x in range(p))
+
+
+# 大步小步法: 在Hasse区间内找出M使 M*P = O
+def _bsgs_multiple(engine, P):
+    low, high = hasse_interval(engine.curve.p)
+    m = math.isqrt(high - low) + 1
+    # 小步: j*P (j = 0..m-1), 共用一次模逆转换为仿射坐标
+    jacobian = [engine._to_jacobian(P)]
+    for _ in range(m - 2):
+        jacobian.append(engine._jacobian_point_add_affine(jacobian[-1], P))
+    baby = {INFINITY: 0}
+    for j, point in enumerate(engine._batch_from_jacobian(jacobian), 1):
+        baby.setdefault(point, j)
+    # 大步: R_i = (low + i*m)*P, 若 -R_i = j*P 则 (low + i*m + j)*P = O
+    step = engine.point_mul(m, P)
+    R = engine.point_mul(low, P)
+    for i in range(m + 1):
+        j = baby.get(engine.point_neg(R))
+        if j is not None:
+            return low + i * m + j
+        R = engine.point_add(R, step)
+    raise ValueError("No multiple of P in Hasse interval")
+
+
+# 点P的阶: 先用BSGS找到P的一个倍数M, 再逐个去掉M中多余的素因子
+def point_order(engine, P):
+    if P == INFINITY:
+        return 1
+    order = _bsgs_multiple(engine, P)
+    for q in factorize(order):
+        while order % q == 0 and engine.point_mul(order // q, P) == INFINITY:
+            order //= q
+    return order
+
+
+# 校验曲线参数, 不合法时抛出ValueError, 通过时返回校验结果(按参数缓存)
+def validate_curve(curve):
+    key = (curve.p, curve.a, curve.b, curve.G, curve.n, curve.h)
+    report = _validated.get(key)
+    if report is not None:
+        return report
+
+    p, a, b, n, h = curve.p, curve.a, curve.b, curve.n, curve.h
+    if p <= 3 or not is_probable_prime(p):
+        raise ValueError(f"{curve.name}: p is not an odd prime")
+    if not (0 <= a < p and 0 <= b < p):
+        raise ValueError(f"{curve.name}: coefficients out of range")
+    if (4 * a * a * a + 27 * b * b) % p == 0:
+        raise ValueError(f"{curve.name}: curve is singular")
+    engine = CurveEngine(curve, 'int')
+    if curve.G == INFINITY or not engine.is_on_curve(curve.G):
+        raise ValueError(f"{curve.name}: G is not on the curve")
+    if not is_probable_prime(n):
+        raise ValueError(f"{curve.name}: n is not prime")
+
+    # G的阶
+    if p <= BSGS_MAX_P:
+        order = point_order(engine, curve.G)
+        if order != n:
+            raise ValueError(f"{curve.name}: order of G is {order}, not n")
+        order_method = 'bsgs'
+    else:
+        # n为素数且G不是无穷远点, n*G = O 即说明G的阶恰为n
+        if engine._from_jacobian(engine._point_mul_jacobian(n, curve.G)) != INFINITY:
+            raise ValueError(f"{curve.name}: n*G is not the point at infinity")
+        order_method = 'n*G'
+
+    # 群阶与余因子
+    # 群阶是n的倍数且落在Hasse区间内, 区间内只有一个倍数时(n > 4√p)群阶唯一确定, 否则小p直接计点
+    low, high = hasse_interval(p)
+    candidates = range((low + n - 1) // n, high // n + 1)
+    if len(candidates) == 1:
+        group_order = candidates[0] * n
+        cofactor_method = 'hasse'
+    elif p <= POINT_COUNT_MAX_P:
+        group_order = count_points(curve)
+        cofactor_method = 'count'
+    else:
+        raise ValueError(f"{curve.name}: cofactor cannot be determined")
+    if group_order != n * h:
+        raise ValueError(f"{curve.name}: group order is {group_order}, not n*h = {n * h}")
+
+    report = _validated[key] = {
+        'curve': curve.name,
+        'order': n,
+        'order_method': order_method,
+        'group_order': group_order,
+        'cofactor': h,
+        'cofactor_method': cofactor_method,
+    }
+    return report
+
+
+# 判断曲线参数是否已通过校验
+def is_validated(curve):
+    return (curve.p, curve.a, curve.b, curve.G, curve.n, curve.h) in _validated
+
+
+# 参数扫描: 在F_p上随机生成曲线, 返回群阶为素数的曲线
+def sweep(p, count, seed=None):
+    rng = random.Random(seed)
+    found = []
+    for i in range(count):
+        a, b = rng.randrange(p), rng.randrange(p)
+        if (4 * a * a * a + 27 * b * b) % p == 0:
+            continue
+        # 随机取曲线上一点作为候选基点
+        engine = CurveEngine(Curve(f'sweep-{i}', p, a, b, 0, 0, 1), 'int')
+        while True:
+            x = rng.randrange(p)
+            y = engine._sqrt(x * x * x + a * x + b)
+            if y:
+                break
+        order = point_order(engine, (x, y))
+        if not is_probable_prime(order):
+            continue
+        curve = Curve(f'sweep-{i}', p, a, b, x, y, order)
+        try:
+            validate_curve(curve)
+        except ValueError:
+            continue
+        found.append(curve)
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="椭圆曲线参数校验")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    check = sub.add_parser('check', help="校验已登记的曲线")
+    check.add_argument('curves', nargs='*', help="曲线名称, 缺省时校验全部")
+
+    sweep_parser = sub.add_parser('sweep', help="随机生成候选曲线并筛选素数阶曲线")
+    sweep_parser.add_argument('--p', type=lambda v: int(v, 0), required=True, help="素数域的模数")
+    sweep_parser.add_argument('--count', type=int, default=1000, help="候选曲线数量")
+    sweep_parser.add_argument('--seed', type=int)
+
+    args = parser.parse_args()
+    if args.command == 'check':
+        failed = 0
+        for name in args.curves or list(CURVES):
+            try:
+                report = validate_curve(CURVES[name])
+            except ValueError as exc:
+                failed += 1
+                print(f"{name}: 校验失败 - {exc}")
+                continue
+            print(f"{name}: 通过 (G的阶: {report['order_method']}, "
+                  f"群阶 {report['group_order']}: {report['cofactor_method']}, 余因子 {report['cofactor']})")
+        raise SystemExit(1 if failed else 0)
+    else:
+        if not is_probable_prime(args.p):
+            parser.error("p must be prime")
+        for curve in sweep(args.p, args.count, args.seed):
+            print(f"a = {curve.a}, b = {curve.b}, G = {curve.G}, n = {curve.n}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,615 @@
+import os
+
+try:
+    import gmpy2
+except ImportError:
+    gmpy2 = None
+
+
+# 通用椭圆曲线运算引擎: 短Weierstrass曲线 y^2 = x^3 + ax + b (mod p)
+# 雅可比坐标点运算、wNAF点乘、固定基窗口表、JSF双标量点乘与批量模逆,
+# 5.1 的 SM2_Optimized 以及 5.2、5.3 的脚本共用同一套实现
+# 仿射坐标的无穷远点统一表示为 (0, 0), 雅可比坐标为 (0, 1, 0)
+
+
+# 域运算后端: 曲线公式只使用 + - * % 运算符, 后端决定参与运算的整数类型以及模逆、模幂的实现
+class FieldBackend:
+    def __init__(self, name, element, inverse, powmod):
+        self.name = name
+        self.element = element  # 将整数转换为后端的域元素类型
+        self.inverse = inverse  # inverse(a, p) = a^-1 mod p
+        self.powmod = powmod    # powmod(a, e, p) = a^e mod p
+
+
+FIELD_BACKENDS = {'int': FieldBackend('int', int, lambda a, p: pow(a, -1, p), pow)}
+if gmpy2 is not None:
+    FIELD_BACKENDS['gmpy2'] = FieldBackend('gmpy2', gmpy2.mpz, gmpy2.invert, gmpy2.powmod)
+# 可通过该环境变量指定后端, 否则有gmpy2时优先使用gmpy2
+FIELD_BACKEND_ENV = 'SM2_FIELD_BACKEND'
+DEFAULT_FIELD_BACKEND = os.environ.get(FIELD_BACKEND_ENV) or ('gmpy2' if gmpy2 is not None else 'int')
+
+# 仿射坐标的无穷远点
+INFINITY = (0, 0)
+
+# 点编码的前缀字节: 未压缩 04∥x∥y, 压缩 02/03∥x (02表示y为偶数, 03表示y为奇数)
+POINT_UNCOMPRESSED = 0x04
+POINT_COMPRESSED_EVEN = 0x02
+POINT_COMPRESSED_ODD = 0x03
+
+# 固定基窗口表的窗口宽度(比特)
+FIXED_BASE_WINDOW = 4
+# 任意点wNAF点乘的窗口宽度(比特)
+WNAF_WINDOW = 5
+# 查表引擎可枚举的最大群阶(倍点表与离散对数索引各占n项)
+TABLE_ENGINE_MAX_ORDER = 1 << 20
+
+
+# 曲线参数: 基点G的阶为n, 余因子h = #E / n
+class Curve:
+    def __init__(self, name, p, a, b, Gx, Gy, n, h=1):
+        self.name = name
+        self.p = p
+        self.a = a
+        self.b = b
+        self.G = (Gx, Gy)
+        self.n = n
+        self.h = h
+
+
+# 已登记的曲线参数
+CURVES = {curve.name: curve for curve in (
+    # SM2推荐曲线(GB/T 32918.5)
+    Curve('sm2p256v1',
+          p=0xFFFFFFFEFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF00000000FFFFFFFFFFFFFFFF,
+          a=0xFFFFFFFEFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF00000000FFFFFFFFFFFFFFFC,
+          b=0x28E9FA9E9D9F5E344D5A9E4BCF6509A7F39789F515AB8F92DDBCBD414D940E93,
+          Gx=0x32C4AE2C1F1981195F9904466A39C9948FE30BBFF2660BE1715A4589334C74C7,
+          Gy=0xBC3736A2F4F6779C59BDCEE36B692153D0A9877CC62A474002DF32E52139F0A0,
+          n=0xFFFFFFFEFFFFFFFFFFFFFFFFFFFFFFFF7203DF6B21C6052B53BBF40939D54123),
+    # SM2标准示例中使用的256位素数域测试曲线(5.2 PoC使用)
+    Curve('sm2-test',
+          p=0x8542D69E4C044F18E8B92435BF6FF7DE457283915C45517D722EDB8B08F1DFC3,
+          a=0x787968B4FA32C3FD2417842E73BBFEFF2F3C848B6831D7E0EC65228B3937E498,
+          b=0x63E4C6D3B23B0C849CF84241484BFE48F61D59A5B16BA06E6E12D1DA27C5249A,
+          Gx=0x421DEBD61B62EAB6746434EBC3CC315E32220B3BADD50BDC4C4E6C147FEDD43D,
+          Gy=0x0680512BCBB42C07D47349D2153B70C4E5D7FDFCBFA36EA1A85841B9E46E09A2,
+          n=0x8542D69E4C044F18E8B92435BF6FF7DD297720630485628D5AE74EE7C32E79B7),
+    # 比特币使用的曲线
+    Curve('secp256k1',
+          p=0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEFFFFFC2F,
+          a=0,
+          b=7,
+          Gx=0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798,
+          Gy=0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8,
+          n=0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141),
+    # 实验用小曲线: y^2 = x^3 + x + 4 (mod 23), 群阶29为素数, 任意非无穷远点都是生成元
+    Curve('toy23', p=23, a=1, b=4, Gx=0, Gy=2, n=29),
+)}
+
+
+class CurveEngine:
+    # 各曲线基点G的固定基窗口表, 按曲线名称缓存, 每个进程只构建一次
+    _g_tables = {}
+
+    def __init__(self, curve, backend=None):
+        if isinstance(curve, str):
+            curve = CURVES[curve]
+        self.curve = curve
+        # 域运算后端; p与a转换为后端的元素类型后, 点运算中的乘法与取模都在该类型上进行
+        self.backend = FIELD_BACKENDS[backend or DEFAULT_FIELD_BACKEND]
+        self.p = self.backend.element(curve.p)
+        self.a = self.backend.element(curve.a)
+        self.b = curve.b
+        self.n = curve.n
+        self.h = curve.h
+        self.G = curve.G
+        # 预计算G的雅可比坐标
+        self.G_jacobian = (curve.G[0], curve.G[1], 1)
+        # 点编码中每个坐标的字节数
+        self.coordinate_size = (curve.p.bit_length() + 7) // 8
+
+    # 模逆(由域运算后端实现)
+    def _mod_inverse(self, a, p):
+        return int(self.backend.inverse(a, p))
+
+    # 雅可比坐标下的点加倍运算
+    def _jacobian_point_double(self, P):
+        if P[2] == 0:  # 无穷远点
+            return P
+
+        X1, Y1, Z1 = P
+
+        XX = (X1 * X1) % self.p
+        YY = (Y1 * Y1) % self.p
+        YYYY = (YY * YY) % self.p
+        ZZ = (Z1 * Z1) % self.p
+        S = 2 * ((X1 + YY) ** 2 - XX - YYYY) % self.p
+        M = (3 * XX + self.a * (ZZ * ZZ) % self.p) % self.p
+        T = (M * M - 2 * S) % self.p
+
+        # 计算新坐标
+        X3 = T
+        Y3 = (M * (S - T) - 8 * YYYY) % self.p
+        Z3 = ((Y1 + Z1) ** 2 - YY - ZZ) % self.p
+
+        return (X3, Y3, Z3)
+
+    # 雅可比坐标下的点加运算
+    def _jacobian_point_add(self, P, Q):
+        if P[2] == 0:  # P是无穷远点
+            return Q
+        if Q[2] == 0:  # Q是无穷远点
+            return P
+
+        X1, Y1, Z1 = P
+        X2, Y2, Z2 = Q
+
+        # 计算中间量
+        Z1Z1 = (Z1 * Z1) % self.p
+        Z2Z2 = (Z2 * Z2) % self.p
+        U1 = (X1 * Z2Z2) % self.p
+        U2 = (X2 * Z1Z1) % self.p
+        S1 = (Y1 * Z2 * Z2Z2) % self.p
+        S2 = (Y2 * Z1 * Z1Z1) % self.p
+
+        H = (U2 - U1) % self.p
+        R = (S2 - S1) % self.p
+
+        if H == 0:
+            if R == 0:
+                return self._jacobian_point_double(P)
+            return (0, 1, 0)  # 无穷远点
+
+        # 计算中间量
+        HH = (H * H) % self.p
+        HHH = (H * HH) % self.p
+        V = (U1 * HH) % self.p
+
+        # 计算新坐标
+        X3 = (R * R - HHH - 2 * V) % self.p
+        Y3 = (R * (V - X3) - S1 * HHH) % self.p
+        Z3 = (H * Z1 * Z2) % self.p
+
+        return (X3, Y3, Z3)
+
+    # 雅可比坐标点与仿射坐标点的混合点加(Q的Z坐标为1, 省去Z2相关的乘法)
+    def _jacobian_point_add_affine(self, P, Q):
+        if Q == (0, 0):  # Q是无穷远点
+            return P
+        if P[2] == 0:  # P是无穷远点
+            return (Q[0], Q[1], 1)
+
+        X1, Y1, Z1 = P
+        x2, y2 = Q
+
+        # 计算中间量
+        Z1Z1 = (Z1 * Z1) % self.p
+        U2 = (x2 * Z1Z1) % self.p
+        S2 = (y2 * Z1 * Z1Z1) % self.p
+
+        H = (U2 - X1) % self.p
+        R = (S2 - Y1) % self.p
+
+        if H == 0:
+            if R == 0:
+                return self._jacobian_point_double(P)
+            return (0, 1, 0)  # 无穷远点
+
+        HH = (H * H) % self.p
+        HHH = (H * HH) % self.p
+        V = (X1 * HH) % self.p
+
+        # 计算新坐标
+        X3 = (R * R - HHH - 2 * V) % self.p
+        Y3 = (R * (V - X3) - Y1 * HHH) % self.p
+        Z3 = (Z1 * H) % self.p
+
+        return (X3, Y3, Z3)
+
+    # 将雅可比坐标转换为仿射坐标
+    def _from_jacobian(self, P):
+        if P[2] == 0:  # 无穷远点
+            return (0, 0)
+
+        X, Y, Z = P
+        Z_inv = self._mod_inverse(Z, self.p)
+        Z_inv_sq = (Z_inv * Z_inv) % self.p
+        x = (X * Z_inv_sq) % self.p
+        y = (Y * Z_inv_sq * Z_inv) % self.p
+        return (int(x), int(y))
+
+    # 批量将雅可比坐标转换为仿射坐标(Montgomery技巧, 所有点共用一次模逆)
+    def _batch_from_jacobian(self, points):
+        # 前缀积: prefix[i] = Z_0 * Z_1 * ... * Z_(i-1), 无穷远点跳过
+        prefix = []
+        acc = 1
+        for X, Y, Z in points:
+            prefix.append(acc)
+            if Z != 0:
+                acc = (acc * Z) % self.p
+
+        inv = self._mod_inverse(acc, self.p)
+        result = [(0, 0)] * len(points)
+        for i in range(len(points) - 1, -1, -1):
+            X, Y, Z = points[i]
+            if Z == 0:
+                continue
+            # Z_i^-1 = (Z_0...Z_i)^-1 * (Z_0...Z_(i-1))
+            Z_inv = (inv * prefix[i]) % self.p
+            inv = (inv * Z) % self.p
+            Z_inv_sq = (Z_inv * Z_inv) % self.p
+            result[i] = (int((X * Z_inv_sq) % self.p), int((Y * Z_inv_sq * Z_inv) % self.p))
+        return result
+
+    # 计算k的宽度为w的非相邻形式(wNAF), 返回低位在前的数字列表
+    # 非零数字均为奇数且绝对值小于2^(w-1), 任意w个相邻数字中至多一个非零
+    def _wnaf(self, k, w=WNAF_WINDOW):
+        digits = []
+        window = 1 << w
+        half = 1 << (w - 1)
+        while k > 0:
+            if k & 1:
+                d = k & (window - 1)
+                if d >= half:
+                    d -= window
+                k -= d
+            else:
+                d = 0
+            digits.append(d)
+            k >>= 1
+        return digits
+
+    # 预计算P的奇数倍 P, 3P, ..., (2^(w-1)-1)P (雅可比坐标)
+    def _odd_multiples_jacobian(self, P, w=WNAF_WINDOW):
+        P_jac = (P[0], P[1], 1) if len(P) == 2 else P
+        P2 = self._jacobian_point_double(P_jac)
+        odd = [P_jac]
+        for _ in range((1 << (w - 2)) - 1):
+            odd.append(self._jacobian_point_add(odd[-1], P2))
+        return odd
+
+    # 预计算P的奇数倍, 统一转换为仿射坐标
+    def _odd_multiples(self, P, w=WNAF_WINDOW):
+        return self._batch_from_jacobian(self._odd_multiples_jacobian(P, w))
+
+    # wNAF滑动窗口点乘(任意点), 返回雅可比坐标
+    def _point_mul_jacobian(self, k, P):
+        # 处理无穷远点
+        if P == (0, 0) or k <= 0:
+            return (0, 1, 0)
+        return self._wnaf_mul_jacobian(k, self._odd_multiples(P))
+
+    # 使用已预计算的奇数倍表计算wNAF点乘, 返回雅可比坐标
+    def _wnaf_mul_jacobian(self, k, table):
+        neg_table = [(x, (-y) % self.p) for x, y in table]
+
+        result = (0, 1, 0)
+        digits = self._wnaf(k)
+        for i in range(len(digits) - 1, -1, -1):
+            result = self._jacobian_point_double(result)
+            d = digits[i]
+            if d > 0:
+                result = self._jacobian_point_add_affine(result, table[d >> 1])
+            elif d < 0:
+                result = self._jacobian_point_add_affine(result, neg_table[(-d) >> 1])
+        return result
+
+    # 雅可比坐标点乘算法(wNAF, 表中各点均以仿射坐标参与混合点加)
+    def _point_mul(self, k, P):
+        return self._from_jacobian(self._point_mul_jacobian(k, P))
+
+    # 构建点P的固定基窗口表: table[i][j - 1] = j * 2^(w*i) * P (仿射坐标)
+    # 标量乘法时每个窗口只需一次查表和一次混合点加, 无需任何倍点运算
+    def _build_fixed_base_table(self, P, window=FIXED_BASE_WINDOW):
+        windows = (self.n.bit_length() + window - 1) // window
+        row_size = (1 << window) - 1
+        points = []
+        base = (P[0], P[1], 1)
+        for _ in range(windows):
+            acc = base
+            points.append(acc)
+            for _ in range(row_size - 1):
+                acc = self._jacobian_point_add(acc, base)
+                points.append(acc)
+            # 下一个窗口的基点为 2^w 倍
+            for _ in range(window):
+                base = self._jacobian_point_double(base)
+
+        # 整张表共用一次模逆转换为仿射坐标
+        points = self._batch_from_jacobian(points)
+        return [points[i:i + row_size] for i in range(0, len(points), row_size)]
+
+    # 获取基点G的预计算表(首次使用时构建)
+    def _get_g_table(self):
+        table = CurveEngine._g_tables.get(self.curve.name)
+        if table is None:
+            table = CurveEngine._g_tables[self.curve.name] = self._build_fixed_base_table(self.G)
+        return table
+
+    # 使用固定基窗口表计算 k*P, 返回雅可比坐标
+    # result为累加起点, 可将k*P直接累加到已有的雅可比坐标点上
+    def _fixed_base_mul_jacobian(self, table, k, window=FIXED_BASE_WINDOW, result=(0, 1, 0)):
+        k %= self.n
+        mask = (1 << window) - 1
+        for row in table:
+            if k == 0:
+                break
+            digit = k & mask
+            if digit:
+                result = self._jacobian_point_add_affine(result, row[digit - 1])
+            k >>= window
+        return result
+
+    # 基点G的快速点乘 k*G
+    def _point_mul_base(self, k):
+        return self._from_jacobian(self._fixed_base_mul_jacobian(self._get_g_table(), k))
+
+    # 计算(k1, k2)的联合稀疏形式(JSF), 返回低位在前的两组{-1, 0, 1}数字
+    # 联合非零列的平均密度约为1/2, 而二进制同时展开约为3/4
+    def _jsf(self, k1, k2):
+        digits1, digits2 = [], []
+        d1, d2 = 0, 0
+        while k1 + d1 > 0 or k2 + d2 > 0:
+            m14 = (k1 + d1) & 3
+            m24 = (k2 + d2) & 3
+            if m14 == 3:
+                m14 = -1
+            if m24 == 3:
+                m24 = -1
+
+            u1 = 0
+            if m14 & 1:
+                m8 = (k1 + d1) & 7
+                u1 = -m14 if (m8 == 3 or m8 == 5) and m24 == 2 else m14
+            u2 = 0
+            if m24 & 1:
+                m8 = (k2 + d2) & 7
+                u2 = -m24 if (m8 == 3 or m8 == 5) and m14 == 2 else m24
+            digits1.append(u1)
+            digits2.append(u2)
+
+            # 更新进位
+            if 2 * d1 == 1 + u1:
+                d1 = 1 - d1
+            if 2 * d2 == 1 + u2:
+                d2 = 1 - d2
+            k1 >>= 1
+            k2 >>= 1
+        return digits1, digits2
+
+    # Shamir技巧同时计算 u*P + v*Q (P、Q为仿射坐标), 返回雅可比坐标
+    # 两个标量共用同一串倍点运算, 中间过程不做任何模逆
+    def _dual_point_mul(self, u, P, v, Q):
+        u %= self.n
+        v %= self.n
+        if P == INFINITY:
+            return self._point_mul_jacobian(v, Q)
+        if Q == INFINITY:
+            return self._point_mul_jacobian(u, P)
+        P_jac = (P[0], P[1], 1)
+        sum_jac = self._jacobian_point_add(P_jac, (Q[0], Q[1], 1))
+        diff_jac = self._jacobian_point_add(P_jac, (Q[0], (-Q[1]) % self.p, 1))
+
+        # 单点使用仿射坐标做混合点加, P±Q 保持雅可比坐标
+        neg_P = (P[0], (-P[1]) % self.p)
+        neg_Q = (Q[0], (-Q[1]) % self.p)
+        affine_terms = {(1, 0): P, (-1, 0): neg_P, (0, 1): Q, (0, -1): neg_Q}
+        jacobian_terms = {
+            (1, 1): sum_jac,
+            (-1, -1): (sum_jac[0], (-sum_jac[1]) % self.p, sum_jac[2]),
+            (1, -1): diff_jac,
+            (-1, 1): (diff_jac[0], (-diff_jac[1]) % self.p, diff_jac[2]),
+        }
+
+        digits1, digits2 = self._jsf(u, v)
+        result = (0, 1, 0)
+        for i in range(len(digits1) - 1, -1, -1):
+            result = self._jacobian_point_double(result)
+            key = (digits1[i], digits2[i])
+            if key in affine_terms:
+                result = self._jacobian_point_add_affine(result, affine_terms[key])
+            elif key in jacobian_terms:
+                result = self._jacobian_point_add(result, jacobian_terms[key])
+        return result
+
+    # 仿射坐标转换为雅可比坐标
+    def _to_jacobian(self, P):
+        if P == INFINITY:
+            return (0, 1, 0)
+        return (P[0], P[1], 1)
+
+    # 判断点是否在曲线上(无穷远点视为在曲线上)
+    def is_on_curve(self, P):
+        if P == INFINITY:
+            return True
+        x, y = P
+        p = self.curve.p
+        return 0 <= x < p and 0 <= y < p and (y * y - x * x * x - self.curve.a * x - self.b) % p == 0
+
+    # 点的逆元 -P
+    def point_neg(self, P):
+        if P == INFINITY:
+            return P
+        return (P[0], (-P[1]) % self.curve.p)
+
+    # 仿射坐标点加 P + Q
+    def point_add(self, P, Q):
+        return self._from_jacobian(self._jacobian_point_add_affine(self._to_jacobian(P), Q))
+
+    # 任意点的标量乘法 k*P (wNAF)
+    def point_mul(self, k, P):
+        return self._point_mul(k, P)
+
+    # 基点的标量乘法 k*G (固定基窗口表)
+    def point_mul_base(self, k):
+        return self._point_mul_base(k)
+
+    # 同时计算 u*P + v*Q
+    def dual_point_mul(self, u, P, v, Q):
+        return self._from_jacobian(self._dual_point_mul(u, P, v, Q))
+
+    # 点编码: 未压缩为 04∥x∥y, 压缩为 02/03∥x, 前缀由y的奇偶决定
+    def encode_point(self, point, compressed=False):
+        x, y = point
+        size = self.coordinate_size
+        if compressed:
+            return bytes([POINT_COMPRESSED_ODD if y & 1 else POINT_COMPRESSED_EVEN]) + x.to_bytes(size, 'big')
+        return bytes([POINT_UNCOMPRESSED]) + x.to_bytes(size, 'big') + y.to_bytes(size, 'big')
+
+    # 由前缀字节得到编码长度
+    def _encoded_point_length(self, data):
+        if not data:
+            raise ValueError("Invalid point encoding")
+        if data[0] == POINT_UNCOMPRESSED:
+            return 1 + 2 * self.coordinate_size
+        if data[0] in (POINT_COMPRESSED_EVEN, POINT_COMPRESSED_ODD):
+            return 1 + self.coordinate_size
+        raise ValueError("Invalid point encoding")
+
+    # 模p平方根, 不存在时返回None
+    # p ≡ 3 (mod 4) 时(SM2、secp256k1等)为 a^((p+1)/4) mod p, 只需一次模幂; 否则使用Tonelli-Shanks算法
+    def _sqrt(self, a):
+        p = self.curve.p
+        a %= p
+        if p % 4 == 3:
+            root = int(self.backend.powmod(a, (p + 1) // 4, self.p))
+            return root if (root * root - a) % p == 0 else None
+        if a == 0:
+            return 0
+        if pow(a, (p - 1) // 2, p) != 1:
+            return None
+        q, s = p - 1, 0
+        while q % 2 == 0:
+            q //= 2
+            s += 1
+        z = 2
+        while pow(z, (p - 1) // 2, p) != p - 1:
+            z += 1
+        m, c, t, root = s, pow(z, q, p), pow(a, q, p), pow(a, (q + 1) // 2, p)
+        while t != 1:
+            i, t2 = 0, t
+            while t2 != 1:
+                t2 = t2 * t2 % p
+                i += 1
+            b = pow(c, 1 << (m - i - 1), p)
+            m, c, t, root = i, b * b % p, t * b * b % p, root * b % p
+        return root
+
+    # 由x与y的奇偶位恢复y
+    def _decompress_y(self, x, y_bit):
+        y = self._sqrt(x * x * x + self.curve.a * x + self.b)
+        if y is None:
+            raise ValueError("Point is not on curve")
+        if y & 1 != y_bit:
+            # y = 0 时 -y 仍为0, 奇数前缀不对应任何点, 拒绝以保证编码唯一
+            if y == 0:
+                raise ValueError("Invalid point encoding")
+            y = self.curve.p - y
+        return y
+
+    # 点解码, 接受未压缩与压缩两种编码, 并检查点在曲线上
+    # 无穷远点没有合法编码: 仿射表示 (0, 0) 会被is_on_curve视为群元素, 必须单独拒绝
+    def decode_point(self, data):
+        if len(data) != self._encoded_point_length(data):
+            raise ValueError("Invalid point encoding")
+        size = self.coordinate_size
+        x = int.from_bytes(data[1:1 + size], 'big')
+        if x >= self.curve.p:
+            raise ValueError("Invalid point encoding")
+        if data[0] == POINT_UNCOMPRESSED:
+            point = (x, int.from_bytes(data[1 + size:], 'big'))
+            if point == INFINITY or not self.is_on_curve(point):
+                raise ValueError("Point is not on curve")
+            return point
+        point = (x, self._decompress_y(x, data[0] & 1))
+        if point == INFINITY:
+            raise ValueError("Point is not on curve")
+        return point
+
+    # 批量点解码
+    # 平方根无法像模逆那样合并成一次, 每个压缩点仍需一次模幂; 批量接口对重复出现的编码只解压一次
+    def decode_points(self, encoded):
+        decoded = {}
+        points = []
+        for data in encoded:
+            data = bytes(data)
+            point = decoded.get(data)
+            if point is None:
+                point = decoded[data] = self.decode_point(data)
+            points.append(point)
+        return points
+
+
+# 小群曲线的穷举查表引擎: 一次性枚举基点G生成的整个循环群
+# multiples[i] = i*G, dlog[P] = i, 群内的点加即离散对数相加 (i + j) mod n,
+# 点乘、点加与离散对数都只需查表, 不再有任何模逆
+class TableCurveEngine(CurveEngine):
+    # 各曲线的枚举结果, 按曲线名称缓存, 每个进程只枚举一次
+    _group_tables = {}
+
+    def __init__(self, curve, backend=None):
+        super().__init__(curve, backend)
+        tables = TableCurveEngine._group_tables.get(self.curve.name)
+        if tables is None:
+            tables = TableCurveEngine._group_tables[self.curve.name] = self._enumerate_group()
+        self.multiples, self.dlog_table = tables
+
+    # 依次累加G得到全部倍点, 同时检查G的阶确为n
+    def _enumerate_group(self):
+        if self.n > TABLE_ENGINE_MAX_ORDER:
+            raise ValueError("Group is too large for table engine")
+        multiples = [INFINITY, self.G]
+        acc = self._to_jacobian(self.G)
+        jacobian = []
+        for _ in range(self.n - 2):
+            acc = self._jacobian_point_add_affine(acc, self.G)
+            if acc[2] == 0:
+                raise ValueError("Order of G is smaller than n")
+            jacobian.append(acc)
+        # 所有倍点共用一次模逆转换为仿射坐标
+        multiples.extend(self._batch_from_jacobian(jacobian))
+        if CurveEngine.point_add(self, multiples[-1], self.G) != INFINITY:
+            raise ValueError("Order of G is not n")
+        dlog_table = {point: i for i, point in enumerate(multiples)}
+        return multiples, dlog_table
+
+    # 以G为底的离散对数, P不在G生成的子群中时返回None
+    def dlog(self, P):
+        return self.dlog_table.get(P)
+
+    def point_neg(self, P):
+        i = self.dlog_table.get(P)
+        if i is None:
+            return super().point_neg(P)
+        return self.multiples[-i % self.n]
+
+    def point_add(self, P, Q):
+        i = self.dlog_table.get(P)
+        j = self.dlog_table.get(Q)
+        if i is None or j is None:
+            return super().point_add(P, Q)
+        return self.multiples[(i + j) % self.n]
+
+    def point_mul(self, k, P):
+        i = self.dlog_table.get(P)
+        if i is None:
+            return super().point_mul(k, P)
+        return self.multiples[k * i % self.n]
+
+    def point_mul_base(self, k):
+        return self.multiples[k % self.n]
+
+    def dual_point_mul(self, u, P, v, Q):
+        i = self.dlog_table.get(P)
+        j = self.dlog_table.get(Q)
+        if i is None or j is None:
+            return super().dual_point_mul(u, P, v, Q)
+        return self.multiples[(u * i + v * j) % self.n]
+
+
+# 按名称创建曲线引擎, 基点阶不超过 TABLE_ENGINE_MAX_ORDER 的小曲线使用查表引擎
+def get_engine(name, backend=None):
+    curve = CURVES[name]
+    if curve.n <= TABLE_ENGINE_MAX_ORDER:
+        return TableCurveEngine(curve, backend)
+    return CurveEngine(curve, backend)